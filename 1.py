@@ -1,27 +1,75 @@
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Set, Any
+from typing import Dict, List, Optional, Set, FrozenSet, Any, NamedTuple, Tuple
+from dataclasses import dataclass
 import pytz
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     MessageHandler,
     filters,
     ContextTypes,
     ConversationHandler,
+    BaseUpdateProcessor,
+    BasePersistence,
+    PersistenceInput,
 )
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.date import DateTrigger
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.memory import MemoryJobStore
 import asyncio
+from contextlib import asynccontextmanager, contextmanager
+import time
 import uuid
+import shutil
 import socket
 import httpx
 from calendar import monthrange
 import math
 import json
 import os
+import re
+import sys
+import hashlib
+import struct
+import zlib
+import bisect
+from collections import deque
+import heapq
+import weakref
+
+# Необязательные зависимости для быстрого снимка данных
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# HTTP/2 для клиента бота (pip install "python-telegram-bot[http2]")
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+# Необязательная зависимость для постоянного хранилища заданий
+try:
+    from sqlalchemy import select
+    from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+except ImportError:
+    SQLAlchemyJobStore = None
+
+# Часовой пояс публикаций (создаётся один раз)
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
 
 # Настройка логирования
 logging.basicConfig(
@@ -41,69 +89,597 @@ SELECTING_DATES, SELECTING_COUNT, SELECTING_TIMES = range(3)
 AVAILABLE_HOURS = list(range(7, 23))
 AVAILABLE_TIMES = [f"{hour:02d}:00" for hour in AVAILABLE_HOURS]
 
-# Файл для хранения данных
+# Максимум публикаций в день
+MAX_TIMES_PER_DAY = 5
+
+# Готовые наборы времени в сетке выбора
+TIME_PRESETS = {
+    'morning': ['07:00', '09:00', '11:00'],
+    'evening': ['18:00', '20:00', '22:00'],
+}
+
+# Максимальное число одновременно обрабатываемых обновлений
+MAX_CONCURRENT_UPDATES = 64
+
+# Время ожидания остальных сообщений медиа-группы (в секундах)
+MEDIA_GROUP_COLLECT_DELAY = 2
+
+# Лимит исходящих уведомлений (сообщений в секунду)
+NOTIFY_RATE_LIMIT = 25
+
+# Интервал сводки новых предложений для администраторов (в секундах)
+SUGGESTION_DIGEST_INTERVAL = 30
+
+# Ограничение пересылок от одного пользователя: запас на всплеск и время восстановления одной попытки (в секундах)
+SUBMIT_BURST = 3
+SUBMIT_REFILL_SECONDS = 20
+
+# Суточная квота предложений от одного пользователя (скользящее окно 24 ч)
+SUGGESTION_DAILY_QUOTA = 20
+
+# Количество предложений на странице режима пакетной модерации
+REVIEW_PAGE_SIZE = 8
+
+# Срок актуальности торговых сигналов (в минутах)
+SIGNAL_TTL_MINUTES = 60
+
+# Период проверки устаревших записей (в секундах)
+EXPIRY_CHECK_INTERVAL = 60
+
+# Файл для хранения данных (JSON, используется для импорта и экспорта)
 DATA_FILE = 'bot_data.json'
 
+# Основное хранилище: бинарный снимок данных
+SNAPSHOT_FILE = 'bot_data.snapshot'
+SNAPSHOT_MAGIC = b'PSNP'
+SNAPSHOT_VERSION = 2
+
+# Количество резервных копий снимка (bot_data.snapshot.1 … .N)
+SNAPSHOT_BACKUPS = 3
+
+# Незавершённые диалоги планирования (состояния ConversationHandler и user_sessions)
+SESSIONS_FILE = 'bot_sessions.snapshot'
+
+# Период записи диалогов на диск (в секундах); нажатия кнопок не ждут записи
+SESSION_SAVE_INTERVAL = 5
+
+# Журнал изменений ролей (JSON-строки, только дозапись)
+AUDIT_LOG_FILE = 'bot_audit.log'
+
+# Сколько последних событий журнала показывать в /audit
+AUDIT_VIEW_LIMIT = 20
+
+# Сжимать снимок zstd (если установлен пакет zstandard)
+SNAPSHOT_COMPRESS = True
+
+# Хранилище заданий публикации (SQLite, если установлен SQLAlchemy)
+JOBSTORE_URL = 'sqlite:///bot_jobs.sqlite'
+POSTS_JOBSTORE = 'posts'
+
+# Служебные задания (перерисовки, сводки, отложенные действия) живут только в памяти
+MEMORY_JOBSTORE = 'default'
+
+# Сколько секунд после пропущенного времени публикация ещё выполняется (например, после простоя)
+POST_MISFIRE_GRACE_TIME = 3600
+
+# Сколько ждать завершения начатых публикаций при остановке (в секундах).
+# Таймаут остановки у супервизора (systemd, docker stop -t) должен быть больше
+SHUTDOWN_DRAIN_TIMEOUT = 20
+
+# Проверка исходных сообщений предстоящих постов: период, горизонт и срок жизни результата (в секундах)
+SOURCE_PROBE_INTERVAL = 300
+SOURCE_PROBE_HORIZON = 3600
+SOURCE_PROBE_TTL = 900
+
+# HTTP-клиент бота: отдельные пулы соединений для отправки и для получения обновлений
+HTTP_SEND_POOL_SIZE = MAX_CONCURRENT_UPDATES
+HTTP_POLLING_POOL_SIZE = 2
+HTTP_TIMEOUT = 30.0
+HTTP_KEEPALIVE_EXPIRY = 60.0
+
+# HTTP/2 (используется, если установлен пакет h2)
+HTTP2_ENABLED = True
+
+# Период записи статистики HTTP-соединений в лог (в секундах)
+HTTP_METRICS_INTERVAL = 600
+
+# Трассировка (формат Chrome trace, открывается в chrome://tracing или Perfetto).
+# None — выключена; включается также ключом запуска --trace <файл>
+TRACE_FILE = None
+TRACE_MAX_EVENTS = 200000
+TRACE_EXPORT_INTERVAL = 300
+
+# Срок жизни кэша метаданных чатов (в секундах)
+CHAT_CACHE_TTL = 3600
+
+# Срок жизни записи «нет доступа к чату» (в секундах): бота могут добавить в чат позже
+CHAT_CACHE_NEGATIVE_TTL = 60
+
+# Служебный чат для проверки сообщений (пересылка с немедленным удалением).
+# None — проверяется только доступ к исходному чату
+PROBE_CHAT_ID = None
+
 # ID первого администратора (ваш ID)
 INITIAL_ADMIN_ID = 1070744113
 
+# Данные загружены (до этого сохранение запрещено, чтобы не затереть файл пустым хранилищем)
+data_loaded = False
+
 # Хранилище для медиа-групп
 media_groups: Dict[str, Dict] = {}
 
 # Глобальные переменные для данных
+# Администраторы из снимка: начальный состав ролей, если журнала ещё нет
 ADMINS: Set[int] = set()
 suggestions: Dict[str, Dict] = {}
 scheduled_messages: Dict[str, Dict] = {}
 user_sessions: Dict[int, Dict] = {}
+review_sessions: Dict[int, Dict] = {}
+
+def parse_datetime(value) -> Optional[datetime]:
+    """Разбор даты из ISO-строки (однократно при загрузке)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+class MessageRef(NamedTuple):
+    """Ссылка на пересланное сообщение"""
+    message_id: int
+    chat_id: int
+    chat_title: Optional[str] = None
+    date: Optional[datetime] = None
+    origin_chat_id: Optional[int] = None
+    origin_message_id: Optional[int] = None
+    origin_date: Optional[datetime] = None  # время публикации оригинала (date — время пересылки боту)
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MessageRef':
+        return cls(
+            data.get('message_id'),
+            data.get('chat_id'),
+            data.get('chat_title'),
+            parse_datetime(data.get('date')),
+            data.get('origin_chat_id'),
+            data.get('origin_message_id'),
+            parse_datetime(data.get('origin_date'))
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            'message_id': self.message_id,
+            'chat_id': self.chat_id,
+            'chat_title': self.chat_title,
+            'date': self.date.isoformat() if self.date else None,
+            'origin_chat_id': self.origin_chat_id,
+            'origin_message_id': self.origin_message_id,
+            'origin_date': self.origin_date.isoformat() if self.origin_date else None
+        }
+
+def forward_origin_date(message) -> Optional[datetime]:
+    """Время публикации пересланного оригинала"""
+    origin = getattr(message, 'forward_origin', None)
+    if origin is not None:
+        return origin.date
+    return getattr(message, 'forward_date', None)
+
+def load_messages(items: List[Dict], cache: Optional[Dict] = None) -> Tuple[MessageRef, ...]:
+    """Загрузка ссылок на сообщения; одинаковые наборы разделяют один объект"""
+    messages = tuple(MessageRef.from_dict(m) for m in items)
+    if cache is None:
+        return messages
+    return cache.setdefault(messages, messages)
+
+@dataclass(slots=True)
+class ScheduledPost:
+    """Запланированная публикация"""
+    id: str
+    user_id: int
+    messages: Tuple[MessageRef, ...]
+    scheduled_at: Optional[datetime]
+    time: str
+    chat_id: int
+    source: str
+    is_media_group: bool = False
+    original_suggester: Optional[int] = None
+    text_hash: Optional[str] = None
+    expires_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    
+    @property
+    def date(self):
+        """Дата публикации по московскому времени"""
+        if not self.scheduled_at:
+            return None
+        if self.scheduled_at.tzinfo is None:
+            return self.scheduled_at.date()
+        return self.scheduled_at.astimezone(MOSCOW_TZ).date()
+    
+    @classmethod
+    def from_dict(cls, data: Dict, cache: Optional[Dict] = None) -> 'ScheduledPost':
+        return cls(
+            id=data['id'],
+            user_id=data.get('user_id'),
+            messages=load_messages(data.get('forwarded_messages_info', []), cache),
+            scheduled_at=parse_datetime(data.get('datetime')),
+            time=data.get('time', ''),
+            chat_id=data.get('chat_id', GROUP_ID),
+            source=sys.intern(data.get('source') or 'Неизвестно'),
+            is_media_group=data.get('is_media_group', False),
+            original_suggester=data.get('original_suggester'),
+            text_hash=data.get('text_hash'),
+            expires_at=parse_datetime(data.get('expires_at')),
+            created_at=parse_datetime(data.get('created_at'))
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'original_suggester': self.original_suggester,
+            'forwarded_messages_info': [m.to_dict() for m in self.messages],
+            'is_media_group': self.is_media_group,
+            'date': self.date.isoformat() if self.scheduled_at else None,
+            'time': self.time,
+            'datetime': self.scheduled_at.isoformat() if self.scheduled_at else None,
+            'chat_id': self.chat_id,
+            'source': self.source,
+            'text_hash': self.text_hash,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+@dataclass(slots=True)
+class Suggestion:
+    """Предложение поста от пользователя"""
+    id: str
+    user_id: int
+    user_info: str
+    message_text: str
+    messages: Tuple[MessageRef, ...]
+    selected_dates: List[str]
+    selected_times: List[str]
+    post_count: int
+    source: str
+    created_at: datetime
+    is_media_group: bool = False
+    text_hash: Optional[str] = None
+    signal: Optional['TradingSignal'] = None
+    expires_at: Optional[datetime] = None
+    
+    @classmethod
+    def from_dict(cls, data: Dict, cache: Optional[Dict] = None) -> 'Suggestion':
+        created_at = parse_datetime(data.get('created_at'))
+        if created_at is None and data.get('created_at'):
+            # Старый формат 'дд.мм.гггг чч:мм'
+            created_at = datetime.strptime(data['created_at'], '%d.%m.%Y %H:%M')
+        messages = load_messages(data.get('forwarded_messages_info', []), cache)
+        
+        if 'signal' in data:
+            signal = TradingSignal(**data['signal']) if data['signal'] else None
+            expires_at = parse_datetime(data.get('expires_at'))
+        else:
+            # Предложения, сохранённые до появления разбора сигналов
+            signal = parse_signal(data.get('message_text'))
+            expires_at = signal_expiry(messages) if signal else None
+        
+        return cls(
+            id=data['id'],
+            user_id=data.get('user_id'),
+            user_info=data.get('user_info', 'Неизвестно'),
+            message_text=data.get('message_text', ''),
+            messages=messages,
+            selected_dates=data.get('selected_dates', []),
+            selected_times=data.get('selected_times', []),
+            post_count=data.get('post_count', 0),
+            source=sys.intern(data.get('source') or 'Неизвестно'),
+            created_at=created_at or datetime.now(),
+            is_media_group=data.get('is_media_group', False),
+            text_hash=data.get('text_hash'),
+            signal=signal,
+            expires_at=expires_at
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'user_info': self.user_info,
+            'message_text': self.message_text,
+            'text_hash': self.text_hash,
+            'signal': self.signal._asdict() if self.signal else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'forwarded_messages_info': [m.to_dict() for m in self.messages],
+            'is_media_group': self.is_media_group,
+            'selected_dates': self.selected_dates,
+            'selected_times': self.selected_times,
+            'post_count': self.post_count,
+            'source': self.source,
+            'created_at': self.created_at.isoformat()
+        }
+
+class Tracer:
+    """Опциональная трассировка: интервалы с монотонным временем, экспорт в Chrome trace JSON"""
+    def __init__(self, max_events: int):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self._events = deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+        # Задача -> номер дорожки. Имена задач не уникальны (PTB называет все обработчики одинаково),
+        # поэтому дорожка закрепляется за объектом задачи и освобождается, когда задача завершится:
+        # число дорожек не превышает число одновременно работавших задач
+        self._lanes: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._free_lanes: List[int] = []
+        self._lane_count = 0
+    
+    def enable(self, path: str):
+        self.enabled = True
+        self.path = path
+        logger.info(f"Трассировка включена, файл: {path}")
+    
+    def _tid(self) -> int:
+        """Номер «потока» в трассе: дорожка асинхронной задачи, в которой выполняется код (0 — вне задач)"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        tid = self._lanes.get(task)
+        if tid is None:
+            if self._free_lanes:
+                tid = heapq.heappop(self._free_lanes)
+            else:
+                self._lane_count += 1
+                tid = self._lane_count
+            self._lanes[task] = tid
+            task.add_done_callback(self._release_lane)
+        return tid
+    
+    def _release_lane(self, task: asyncio.Task):
+        tid = self._lanes.pop(task, None)
+        if tid is not None:
+            heapq.heappush(self._free_lanes, tid)
+    
+    @contextmanager
+    def span(self, name: str, **args):
+        if not self.enabled:
+            yield
+            return
+        tid = self._tid()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._events.append({
+                'name': name,
+                'ph': 'X',
+                'ts': (started - self._origin) * 1e6,
+                'dur': (time.perf_counter() - started) * 1e6,
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': args
+            })
+    
+    def export(self, path: Optional[str] = None):
+        """Записать накопленные интервалы (последние TRACE_MAX_EVENTS)"""
+        path = path or self.path
+        if not self.enabled or not path:
+            return
+        names = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+             'args': {'name': f"задачи {tid}" if tid else 'main'}}
+            for tid in range(self._lane_count + 1)
+        ]
+        trace = {'traceEvents': names + list(self._events), 'displayTimeUnit': 'ms'}
+        atomic_write(path, json.dumps(trace, ensure_ascii=False, default=str).encode('utf-8'))
+        logger.info(f"Трасса записана в {path}: {len(self._events)} интервалов")
+
+tracer = Tracer(TRACE_MAX_EVENTS)
+
+async def export_trace_job():
+    """Периодическая запись трассы (в цикле событий, а не в потоке планировщика)"""
+    tracer.export()
+
+# Коды сжатия в заголовке снимка
+SNAPSHOT_COMPRESSION_NONE = 0
+SNAPSHOT_COMPRESSION_ZSTD = 1
+
+# Заголовок снимка версии 2: сигнатура, версия, сжатие, длина и CRC32 данных
+SNAPSHOT_HEADER = struct.Struct('>4sBBQI')
+
+class SnapshotError(ValueError):
+    """Снимок повреждён или не может быть прочитан"""
+
+def encode_payload(data: Dict) -> bytes:
+    """Сериализация данных (orjson, если установлен)"""
+    if orjson:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def decode_payload(raw: bytes) -> Dict:
+    """Десериализация данных (orjson, если установлен)"""
+    if orjson:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def fsync_directory(path: str):
+    """Сброс на диск записи каталога (чтобы переименование пережило сбой питания)"""
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def atomic_write(path: str, *chunks: bytes):
+    """Атомарная запись: временный файл, fsync и переименование поверх старого"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(path)
+
+def snapshot_backup_path(path: str, n: int) -> str:
+    return f"{path}.{n}"
+
+def rotate_backups(path: str, count: int = SNAPSHOT_BACKUPS):
+    """Сдвиг резервных копий: path.N-1 → path.N, …, path → path.1"""
+    if count <= 0 or not os.path.exists(path):
+        return
+    for n in range(count - 1, 0, -1):
+        older = snapshot_backup_path(path, n)
+        if os.path.exists(older):
+            os.replace(older, snapshot_backup_path(path, n + 1))
+    # Жёсткая ссылка оставляет path на месте до замены новым снимком
+    backup = snapshot_backup_path(path, 1)
+    if os.path.exists(backup):
+        os.remove(backup)
+    try:
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+
+def write_snapshot(path: str, data: Dict, backups: int = 0):
+    """Запись снимка: заголовок (сигнатура, версия, сжатие, длина, CRC32) и данные"""
+    write_snapshot_payload(path, encode_payload(data), backups)
+
+def write_snapshot_payload(path: str, payload: bytes, backups: int = 0):
+    """Запись уже сериализованных данных в снимок"""
+    compression = SNAPSHOT_COMPRESSION_NONE
+    if SNAPSHOT_COMPRESS and zstandard:
+        payload = zstandard.ZstdCompressor(level=3).compress(payload)
+        compression = SNAPSHOT_COMPRESSION_ZSTD
+    
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, compression,
+                                  len(payload), zlib.crc32(payload))
+    rotate_backups(path, backups)
+    atomic_write(path, header, payload)
+
+def read_snapshot(path: str) -> Dict:
+    """Чтение снимка с проверкой заголовка и контрольной суммы"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    
+    if raw[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or len(raw) < len(SNAPSHOT_MAGIC) + 2:
+        raise SnapshotError(f"{path}: неизвестный формат снимка")
+    version, compression = raw[len(SNAPSHOT_MAGIC)], raw[len(SNAPSHOT_MAGIC) + 1]
+    if version > SNAPSHOT_VERSION:
+        raise SnapshotError(f"{path}: версия снимка {version} новее поддерживаемой {SNAPSHOT_VERSION}")
+    
+    if version == 1:
+        # Снимки первой версии не содержат длины и контрольной суммы
+        payload = raw[len(SNAPSHOT_MAGIC) + 2:]
+    else:
+        if len(raw) < SNAPSHOT_HEADER.size:
+            raise SnapshotError(f"{path}: заголовок снимка обрезан")
+        _, _, compression, length, checksum = SNAPSHOT_HEADER.unpack_from(raw)
+        payload = raw[SNAPSHOT_HEADER.size:]
+        if len(payload) != length:
+            raise SnapshotError(f"{path}: снимок обрезан ({len(payload)} из {length} байт)")
+        if zlib.crc32(payload) != checksum:
+            raise SnapshotError(f"{path}: контрольная сумма не совпадает")
+    
+    if compression == SNAPSHOT_COMPRESSION_ZSTD:
+        if not zstandard:
+            raise RuntimeError(f"{path}: для чтения сжатого снимка нужен пакет zstandard")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    return decode_payload(payload)
+
+def serialize_data() -> Dict:
+    """Данные бота в виде, пригодном для сериализации"""
+    return {
+        'admins': access.members(ROLE_OWNER, ROLE_ADMIN) or list(ADMINS),
+        'suggestions': {sugg_id: sugg.to_dict() for sugg_id, sugg in suggestions.items()},
+        'scheduled_messages': {msg_id: msg.to_dict() for msg_id, msg in scheduled_messages.items()}
+    }
+
+def apply_data(data: Dict):
+    """Заполнение хранилища из сериализованных данных"""
+    global ADMINS, suggestions, scheduled_messages, data_loaded
+    
+    # Загружаем администраторов
+    ADMINS = set(data.get('admins', [INITIAL_ADMIN_ID]))
+    
+    # Одинаковые наборы сообщений у разных записей разделяют один объект
+    messages_cache = {}
+    
+    # Загружаем предложения
+    suggestions = {}
+    for sugg_id, sugg in data.get('suggestions', {}).items():
+        try:
+            suggestions[sugg_id] = Suggestion.from_dict(sugg, messages_cache)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки предложения {sugg_id}: {e}")
+    
+    # Загружаем запланированные сообщения
+    scheduled_messages = {}
+    for msg_id, msg in data.get('scheduled_messages', {}).items():
+        try:
+            scheduled_messages[msg_id] = ScheduledPost.from_dict(msg, messages_cache)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки поста {msg_id}: {e}")
+    
+    data_loaded = True
+
+def read_json(path: str) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def quarantine_snapshot(path: str):
+    """Повреждённый основной снимок откладывается, чтобы не попасть в ротацию копий"""
+    corrupt_path = f"{path}.corrupt"
+    os.replace(path, corrupt_path)
+    logger.warning(f"Повреждённый снимок сохранён как {corrupt_path}")
 
 # Загрузка данных из файла
 def load_data():
-    """Загрузка данных из JSON файла"""
-    global ADMINS, suggestions, scheduled_messages
-    
-    if os.path.exists(DATA_FILE):
+    """Загрузка данных из снимка; при повреждении — из последней целой резервной копии"""
+    candidates = [(SNAPSHOT_FILE, read_snapshot)]
+    candidates += [(snapshot_backup_path(SNAPSHOT_FILE, n), read_snapshot)
+                   for n in range(1, SNAPSHOT_BACKUPS + 1)]
+    # Миграция: JSON читается, только если снимков ещё нет.
+    # Если снимки есть, но все повреждены, старый JSON затёр бы хранилище при первом сохранении
+    if not any(os.path.exists(path) for path, _ in candidates):
+        candidates.append((DATA_FILE, read_json))
+    
+    failures = []
+    for path, reader in candidates:
+        if not os.path.exists(path):
+            continue
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-                # Загружаем администраторов
-                ADMINS = set(data.get('admins', [INITIAL_ADMIN_ID]))
-                
-                # Загружаем предложения
-                suggestions = data.get('suggestions', {})
-                
-                # Загружаем запланированные сообщения
-                scheduled_messages = {}
-                for msg_id, msg in data.get('scheduled_messages', {}).items():
-                    # Восстанавливаем datetime из строки
-                    if 'datetime' in msg and isinstance(msg['datetime'], str):
-                        try:
-                            msg['datetime'] = datetime.fromisoformat(msg['datetime'])
-                        except:
-                            msg['datetime'] = None
-                    if 'date' in msg and isinstance(msg['date'], str):
-                        try:
-                            msg['date'] = datetime.fromisoformat(msg['date']).date()
-                        except:
-                            msg['date'] = None
-                    
-                    # Восстанавливаем forwarded_messages_info
-                    if 'forwarded_messages_info' not in msg:
-                        msg['forwarded_messages_info'] = []
-                    
-                    scheduled_messages[msg_id] = msg
-                
-                logger.info(f"Данные загружены: {len(ADMINS)} админов, {len(suggestions)} предложений, {len(scheduled_messages)} запланированных постов")
-                
+            data = reader(path)
         except Exception as e:
-            logger.error(f"Ошибка загрузки данных: {e}")
-            ADMINS = {INITIAL_ADMIN_ID}
-            suggestions = {}
-            scheduled_messages = {}
+            logger.error(f"Не удалось прочитать {path}: {e}")
+            failures.append(path)
+            continue
+        
+        if failures:
+            logger.warning(f"Данные восстановлены из {path}")
+            if SNAPSHOT_FILE in failures:
+                quarantine_snapshot(SNAPSHOT_FILE)
+        elif reader is read_json:
+            logger.info(f"Снимок не найден, импорт данных из {DATA_FILE}")
+        apply_data(data)
+        break
     else:
-        ADMINS = {INITIAL_ADMIN_ID}
-        suggestions = {}
-        scheduled_messages = {}
+        if failures:
+            # Пустое хранилище перезаписало бы расписание при первом сохранении
+            raise RuntimeError(f"Не удалось загрузить данные ни из одного файла: {', '.join(failures)}")
+        apply_data({})
+    
+    logger.info(f"Данные загружены: {len(ADMINS)} админов, {len(suggestions)} предложений, {len(scheduled_messages)} запланированных постов")
     
     return {
         'admins': list(ADMINS),
@@ -112,44 +688,395 @@ def load_data():
     }
 
 def save_data():
-    """Сохранение данных в JSON файл"""
+    """Сохранение данных в снимок"""
+    if not data_loaded:
+        logger.warning("Данные ещё не загружены, сохранение пропущено")
+        return
     try:
-        # Подготавливаем данные для сериализации
-        serializable_data = {
-            'admins': list(ADMINS),
-            'suggestions': suggestions,
-            'scheduled_messages': {}
-        }
-        
-        # Сериализуем запланированные сообщения
-        for msg_id, msg in scheduled_messages.items():
-            serializable_msg = msg.copy()
-            
-            # Удаляем несериализуемые объекты
-            serializable_msg.pop('bot', None)
-            serializable_msg.pop('original_messages', None)
-            serializable_msg.pop('forwarded_messages', None)
-            
-            # Конвертируем datetime в строку
-            if 'datetime' in serializable_msg and serializable_msg['datetime']:
-                if isinstance(serializable_msg['datetime'], datetime):
-                    serializable_msg['datetime'] = serializable_msg['datetime'].isoformat()
-            
-            if 'date' in serializable_msg and serializable_msg['date']:
-                if hasattr(serializable_msg['date'], 'isoformat'):
-                    serializable_msg['date'] = serializable_msg['date'].isoformat()
-            
-            serializable_data['scheduled_messages'][msg_id] = serializable_msg
-        
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(serializable_data, f, ensure_ascii=False, indent=2)
-        
+        with tracer.span("persist.serialize"):
+            data = serialize_data()
+        with tracer.span("persist.write"):
+            write_snapshot(SNAPSHOT_FILE, data, backups=SNAPSHOT_BACKUPS)
         logger.info("Данные сохранены")
     except Exception as e:
         logger.error(f"Ошибка сохранения данных: {e}")
 
+def export_json(path: str = DATA_FILE):
+    """Экспорт данных в JSON (для переноса и ручной проверки)"""
+    content = json.dumps(serialize_data(), ensure_ascii=False, indent=2)
+    atomic_write(path, content.encode('utf-8'))
+    logger.info(f"Данные экспортированы в {path}")
+
+def import_json(path: str = DATA_FILE):
+    """Импорт данных из JSON с перезаписью снимка"""
+    apply_data(read_json(path))
+    rebuild_indexes()
+    save_data()
+    logger.info(f"Данные импортированы из {path}")
+
+def text_fingerprint(text: Optional[str]) -> Optional[str]:
+    """Хеш нормализованного текста сообщения (регистр, пробелы и знаки не учитываются)"""
+    if not text:
+        return None
+    normalized = ' '.join(re.findall(r'\w+', text.casefold()))
+    if not normalized:
+        return None
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+
+def content_fingerprints(messages: Tuple[MessageRef, ...], text_hash: Optional[str]) -> List[tuple]:
+    """Отпечатки содержимого: исходные ID сообщений и хеш текста"""
+    keys = []
+    ids = tuple(
+        (m.origin_chat_id or m.chat_id, m.origin_message_id or m.message_id)
+        for m in messages
+    )
+    if ids:
+        keys.append(('ids', ids))
+    if text_hash:
+        keys.append(('text', text_hash))
+    return keys
+
+def record_fingerprints(record) -> List[tuple]:
+    """Отпечатки содержимого предложения или поста"""
+    return content_fingerprints(record.messages, record.text_hash)
+
+def slot_fingerprints(keys: List[tuple], when: Optional[datetime]) -> List[tuple]:
+    """Отпечатки публикации: содержимое плюс время публикации"""
+    when = when.isoformat() if when else None
+    return [key + (when,) for key in keys]
+
+class FingerprintIndex:
+    """Индекс отпечатков содержимого для поиска дубликатов за O(1)"""
+    def __init__(self):
+        self._owners: Dict[tuple, Set[str]] = {}
+    
+    def find(self, keys: List[tuple]) -> Set[str]:
+        """ID записей, совпадающих хотя бы по одному отпечатку"""
+        found = set()
+        for key in keys:
+            found |= self._owners.get(key, set())
+        return found
+    
+    def add(self, record_id: str, keys: List[tuple]):
+        for key in keys:
+            self._owners.setdefault(key, set()).add(record_id)
+    
+    def discard(self, record_id: str, keys: List[tuple]):
+        for key in keys:
+            owners = self._owners.get(key)
+            if owners:
+                owners.discard(record_id)
+                if not owners:
+                    del self._owners[key]
+    
+    def clear(self):
+        self._owners.clear()
+
+suggestion_fingerprints = FingerprintIndex()
+post_fingerprints = FingerprintIndex()
+
+class TradingSignal(NamedTuple):
+    """Разобранный торговый сигнал"""
+    symbol: str
+    side: str
+    probability: Optional[float]
+    entry: Optional[float]
+    stop_loss: Optional[float]
+    take_profit: Optional[float]
+    indicators: Dict[str, float]
+
+SIGNAL_HEADER_RE = re.compile(r'^\s*(BUY|SELL|LONG|SHORT)\s+([A-Z0-9]{2,20})\b', re.IGNORECASE)
+SIGNAL_NUMBER = r'([-+]?\d+(?:[.,]\d+)?)'
+SIGNAL_FIELDS = {
+    'probability': re.compile(r'Вероятность\s*:\s*' + SIGNAL_NUMBER, re.IGNORECASE),
+    'entry': re.compile(r'Вход\s*:\s*' + SIGNAL_NUMBER, re.IGNORECASE),
+    'stop_loss': re.compile(r'\bSL\s*:\s*' + SIGNAL_NUMBER),
+    'take_profit': re.compile(r'\bTP\s*:\s*' + SIGNAL_NUMBER),
+}
+SIGNAL_INDICATOR_RE = re.compile(r'(\w+)\s*=\s*' + SIGNAL_NUMBER)
+SIGNAL_SIDES = {'BUY': 'BUY', 'LONG': 'BUY', 'SELL': 'SELL', 'SHORT': 'SELL'}
+
+def parse_signal(text: Optional[str]) -> Optional[TradingSignal]:
+    """Разбор текста сигнала вида "SELL DOGEUSDT / Вероятность / Вход / SL / TP / ..." """
+    if not text:
+        return None
+    header = SIGNAL_HEADER_RE.match(text)
+    if not header:
+        return None
+    
+    values = {}
+    for field, pattern in SIGNAL_FIELDS.items():
+        match = pattern.search(text)
+        values[field] = float(match.group(1).replace(',', '.')) if match else None
+    
+    indicators = {
+        name: float(value.replace(',', '.'))
+        for name, value in SIGNAL_INDICATOR_RE.findall(text)
+    }
+    
+    return TradingSignal(
+        symbol=header.group(2).upper(),
+        side=SIGNAL_SIDES[header.group(1).upper()],
+        indicators=indicators,
+        **values
+    )
+
+class SignalIndex:
+    """Индекс сигналов по символу и вероятности"""
+    def __init__(self):
+        self._by_symbol: Dict[str, Set[str]] = {}
+        self._by_probability: List[tuple] = []  # (-вероятность, id), по убыванию вероятности
+        self._probability: Dict[str, float] = {}
+    
+    def add(self, record_id: str, signal: Optional[TradingSignal]):
+        if signal is None:
+            return
+        self._by_symbol.setdefault(signal.symbol, set()).add(record_id)
+        probability = signal.probability or 0.0
+        self._probability[record_id] = probability
+        bisect.insort(self._by_probability, (-probability, record_id))
+    
+    def discard(self, record_id: str, signal: Optional[TradingSignal]):
+        if signal is None or record_id not in self._probability:
+            return
+        ids = self._by_symbol.get(signal.symbol)
+        if ids:
+            ids.discard(record_id)
+            if not ids:
+                del self._by_symbol[signal.symbol]
+        key = (-self._probability.pop(record_id), record_id)
+        pos = bisect.bisect_left(self._by_probability, key)
+        if pos < len(self._by_probability) and self._by_probability[pos] == key:
+            del self._by_probability[pos]
+    
+    def clear(self):
+        self._by_symbol.clear()
+        self._by_probability.clear()
+        self._probability.clear()
+    
+    def symbols(self) -> Dict[str, int]:
+        """Символы и количество сигналов по каждому"""
+        return {symbol: len(ids) for symbol, ids in self._by_symbol.items()}
+    
+    def query(self, min_probability: float = 0.0, symbol: Optional[str] = None) -> List[str]:
+        """ID сигналов с вероятностью не ниже заданной, по убыванию вероятности"""
+        if symbol:
+            ids = [rid for rid in self._by_symbol.get(symbol, ()) if self._probability[rid] >= min_probability]
+            return sorted(ids, key=lambda rid: (-self._probability[rid], rid))
+        cutoff = bisect.bisect_right(self._by_probability, (-min_probability, '\uffff'))
+        return [rid for _, rid in self._by_probability[:cutoff]]
+
+signal_index = SignalIndex()
+
+class ExpiryIndex:
+    """Очередь истечения срока актуальности, упорядоченная по времени"""
+    def __init__(self):
+        self._heap: List[tuple] = []
+    
+    def push(self, record, kind: str):
+        """Добавить запись со сроком актуальности"""
+        if record.expires_at:
+            heapq.heappush(self._heap, (record.expires_at, kind, record.id))
+    
+    def pop_expired(self, now: datetime) -> List[tuple]:
+        """Извлечь все записи, срок которых истёк к моменту now"""
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            _, kind, record_id = heapq.heappop(self._heap)
+            expired.append((kind, record_id))
+        return expired
+    
+    def clear(self):
+        self._heap.clear()
+
+expiry_index = ExpiryIndex()
+
+def post_sort_key(post) -> tuple:
+    return (post.scheduled_at.timestamp() if post.scheduled_at else 0.0, post.id)
+
+class PostIndex:
+    """Вторичные индексы запланированных постов по автору, предложившему и источнику.
+    Каждый срез упорядочен по времени публикации, страница берётся срезом списка."""
+    FIELDS = ('user_id', 'original_suggester', 'source')
+    
+    def __init__(self):
+        self._all: List[tuple] = []
+        self._by: Dict[str, Dict[Any, List[tuple]]] = {field: {} for field in self.FIELDS}
+    
+    def _bucket(self, field: Optional[str], value) -> List[tuple]:
+        if field is None:
+            return self._all
+        return self._by[field].get(value, [])
+    
+    def add(self, post: ScheduledPost):
+        key = post_sort_key(post)
+        bisect.insort(self._all, key)
+        for field in self.FIELDS:
+            value = getattr(post, field)
+            if value is not None:
+                bisect.insort(self._by[field].setdefault(value, []), key)
+    
+    def discard(self, post: ScheduledPost):
+        key = post_sort_key(post)
+        for field in (None, *self.FIELDS):
+            value = getattr(post, field) if field else None
+            bucket = self._bucket(field, value)
+            pos = bisect.bisect_left(bucket, key)
+            if pos < len(bucket) and bucket[pos] == key:
+                del bucket[pos]
+                if field and not bucket:
+                    del self._by[field][value]
+    
+    def rebuild(self, posts):
+        """Построение за один проход с однократной сортировкой"""
+        self.clear()
+        for post in posts:
+            key = post_sort_key(post)
+            self._all.append(key)
+            for field in self.FIELDS:
+                value = getattr(post, field)
+                if value is not None:
+                    self._by[field].setdefault(value, []).append(key)
+        self._all.sort()
+        for buckets in self._by.values():
+            for bucket in buckets.values():
+                bucket.sort()
+    
+    def clear(self):
+        self._all.clear()
+        for buckets in self._by.values():
+            buckets.clear()
+    
+    def count(self, field: Optional[str] = None, value=None) -> int:
+        return len(self._bucket(field, value))
+    
+    def page(self, field: Optional[str], value, offset: int, limit: int) -> List[str]:
+        """ID постов среза по времени публикации"""
+        return [post_id for _, post_id in self._bucket(field, value)[offset:offset + limit]]
+    
+    def ids(self, field: Optional[str] = None, value=None) -> List[str]:
+        return [post_id for _, post_id in self._bucket(field, value)]
+    
+    def range(self, start: datetime, end: datetime, field: Optional[str] = None, value=None) -> List[str]:
+        """ID постов с временем публикации в [start, end)"""
+        bucket = self._bucket(field, value)
+        lo = bisect.bisect_left(bucket, (start.timestamp(), ''))
+        hi = bisect.bisect_left(bucket, (end.timestamp(), ''))
+        return [post_id for _, post_id in bucket[lo:hi]]
+    
+    def groups(self, field: str) -> List[tuple]:
+        """Значения поля и количество постов, по убыванию количества"""
+        return sorted(((value, len(bucket)) for value, bucket in self._by[field].items()),
+                      key=lambda item: (-item[1], str(item[0])))
+
+post_index = PostIndex()
+
+def source_token(source: str) -> str:
+    """Короткий ключ источника для callback_data"""
+    return hashlib.blake2b(source.encode('utf-8'), digest_size=6).hexdigest()
+
+def resolve_source_token(token: str) -> Optional[str]:
+    for source, _ in post_index.groups('source'):
+        if source_token(source) == token:
+            return source
+    return None
+
+def signal_expiry(messages: Tuple[MessageRef, ...]) -> datetime:
+    """Срок актуальности сигнала: время публикации оригинала плюс SIGNAL_TTL_MINUTES.
+    Для записей без времени оригинала — время пересылки боту"""
+    published = [m.origin_date for m in messages if m.origin_date]
+    if not published:
+        published = [m.date for m in messages if m.date]
+    base = min(published) if published else datetime.now(pytz.utc)
+    return base + timedelta(minutes=SIGNAL_TTL_MINUTES)
+
+def is_expired(record) -> bool:
+    """Истёк ли срок актуальности записи"""
+    return bool(record.expires_at) and record.expires_at <= datetime.now(pytz.utc)
+
+def post_index_keys(post: ScheduledPost) -> List[tuple]:
+    keys = record_fingerprints(post)
+    return keys + slot_fingerprints(keys, post.scheduled_at)
+
+def add_suggestion(sugg: Suggestion):
+    """Добавить предложение в хранилище и индексы"""
+    suggestions[sugg.id] = sugg
+    suggestion_fingerprints.add(sugg.id, record_fingerprints(sugg))
+    signal_index.add(sugg.id, sugg.signal)
+    expiry_index.push(sugg, 'suggestion')
+
+def remove_suggestion(suggestion_id: str) -> Optional[Suggestion]:
+    """Удалить предложение из хранилища и индексов"""
+    sugg = suggestions.pop(suggestion_id, None)
+    if sugg is not None:
+        suggestion_fingerprints.discard(suggestion_id, record_fingerprints(sugg))
+        signal_index.discard(suggestion_id, sugg.signal)
+    return sugg
+
+def add_scheduled_post(post: ScheduledPost):
+    """Добавить запланированный пост в хранилище и индексы"""
+    scheduled_messages[post.id] = post
+    post_fingerprints.add(post.id, post_index_keys(post))
+    post_index.add(post)
+    expiry_index.push(post, 'post')
+
+def remove_scheduled_post(post_id: str) -> Optional[ScheduledPost]:
+    """Удалить запланированный пост из хранилища и индексов"""
+    post = scheduled_messages.pop(post_id, None)
+    if post is not None:
+        post_fingerprints.discard(post_id, post_index_keys(post))
+        post_index.discard(post)
+    return post
+
+def rebuild_indexes():
+    """Построить индексы по загруженным данным"""
+    suggestion_fingerprints.clear()
+    post_fingerprints.clear()
+    signal_index.clear()
+    expiry_index.clear()
+    for sugg_id, sugg in suggestions.items():
+        suggestion_fingerprints.add(sugg_id, record_fingerprints(sugg))
+        signal_index.add(sugg_id, sugg.signal)
+        expiry_index.push(sugg, 'suggestion')
+    for post_id, post in scheduled_messages.items():
+        post_fingerprints.add(post_id, post_index_keys(post))
+        expiry_index.push(post, 'post')
+    post_index.rebuild(scheduled_messages.values())
+
+def is_slot_taken(keys: List[tuple], scheduled_datetime: datetime) -> bool:
+    """Есть ли уже публикация того же содержимого на это время"""
+    return bool(post_fingerprints.find(slot_fingerprints(keys, scheduled_datetime)))
+
+def find_pending_publication(keys: List[tuple]) -> Optional[str]:
+    """ID ещё не опубликованного поста с тем же содержимым"""
+    now = datetime.now(MOSCOW_TZ)
+    for post_id in post_fingerprints.find(keys):
+        when = scheduled_messages[post_id].scheduled_at
+        if when and when > now:
+            return post_id
+    return None
+
+def create_posts_jobstore():
+    """Хранилище заданий публикации: постоянное (SQLite) или в памяти"""
+    if SQLAlchemyJobStore:
+        return SQLAlchemyJobStore(url=JOBSTORE_URL)
+    logger.warning("SQLAlchemy не установлен, задания публикации хранятся в памяти")
+    return MemoryJobStore()
+
+def stored_job_ids(store) -> Set[str]:
+    """ID заданий в хранилище (без десериализации самих заданий)"""
+    if SQLAlchemyJobStore and isinstance(store, SQLAlchemyJobStore):
+        with store.engine.begin() as conn:
+            return {row[0] for row in conn.execute(select(store.jobs_t.c.id))}
+    return {job.id for job in store.get_all_jobs()}
+
 # Инициализация планировщика
-scheduler = AsyncIOScheduler(timezone=pytz.timezone('Europe/Moscow'))
+scheduler = AsyncIOScheduler(timezone=MOSCOW_TZ)
+
+# Задания публикации живут в отдельном хранилище; отложенные действия
+# и служебные задания остаются в памяти (хранилище "default")
+posts_jobstore = create_posts_jobstore()
+scheduler.add_jobstore(posts_jobstore, POSTS_JOBSTORE)
 
 class PostScheduler:
     def __init__(self):
@@ -161,29 +1088,34 @@ class PostScheduler:
         """Отправка сообщения с повторными попытками при ошибке"""
         for attempt in range(self.max_retries):
             try:
-                return await method(*args, **kwargs)
+                with tracer.span(f"send.{getattr(method, '__name__', 'call')}", attempt=attempt + 1):
+                    return await method(*args, **kwargs)
             except (httpx.ReadError, httpx.ConnectError, socket.error) as e:
                 logger.warning(f"Ошибка сети при отправке (попытка {attempt + 1}/{self.max_retries}): {e}")
                 if attempt < self.max_retries - 1:
-                    await asyncio.sleep(self.retry_delay * (attempt + 1))
+                    with tracer.span("send.retry_sleep", attempt=attempt + 1):
+                        await asyncio.sleep(self.retry_delay * (attempt + 1))
                 else:
                     raise
             except Exception as e:
                 logger.error(f"Неизвестная ошибка при отправке: {e}")
                 raise
             
-    async def send_scheduled_message(self, chat_id: int, message_data: Dict):
-        """Отправка запланированного сообщения как репост"""
+    async def send_scheduled_message(self, post_id: str, start: int = 0):
+        """Отправка запланированного сообщения как репост (с сообщения start после прерванной остановки)"""
         try:
-            bot = message_data.get('bot')
-            if not bot:
-                logger.error("Bot object not found in message_data")
+            # Пост и бот берутся из реестра в момент срабатывания задания
+            post = registry.get_post(post_id)
+            if post is None:
+                logger.warning(f"Запланированный пост {post_id} не найден, публикация пропущена")
                 return
+            bot = registry.get_bot()
+            chat_id = post.chat_id
             
-            user_id = message_data.get('user_id')
+            user_id = post.user_id
             
             # Получаем информацию о сообщениях для репоста
-            forwarded_messages_info = message_data.get('forwarded_messages_info', [])
+            forwarded_messages_info = post.messages
             
             if not forwarded_messages_info:
                 logger.error("Нет информации о сообщениях для отправки")
@@ -197,63 +1129,61 @@ class PostScheduler:
                 return
             
             # Проверяем, нужно ли отправить сообщение сегодня
-            today = datetime.now().date()
-            post_date = message_data.get('date')
+            today = datetime.now(MOSCOW_TZ).date()
+            post_date = post.date
             
-            if post_date:
-                try:
-                    if isinstance(post_date, str):
-                        post_date_obj = datetime.fromisoformat(post_date).date()
-                    else:
-                        post_date_obj = post_date
-                    
-                    if post_date_obj != today:
-                        logger.info(f"Пропускаем пост на дату {post_date_obj}, сегодня {today}")
-                        return
-                except Exception as e:
-                    logger.error(f"Ошибка при парсинге даты: {e}")
+            # Продолжение прерванной публикации проверено при первом запуске (мог наступить новый день)
+            if post_date and post_date != today and not start:
+                logger.info(f"Пропускаем пост на дату {post_date}, сегодня {today}")
+                return
             
-            post_time = message_data.get('time', '')
+            post_time = post.time
             
-            # Отправляем все сообщения
-            successful_sends = 0
-            for i, msg_info in enumerate(forwarded_messages_info):
-                try:
-                    from_chat_id = msg_info.get('chat_id')
-                    message_id = msg_info.get('message_id')
-                    
-                    if not from_chat_id or not message_id:
-                        logger.error(f"Неполная информация о сообщении: {msg_info}")
+            # Отправляем все сообщения (уже отправленные до перезапуска пропускаем)
+            successful_sends = start
+            for i, msg_info in enumerate(forwarded_messages_info[start:], start):
+                shutdown_coordinator.progress(i)
+                from_chat_id = msg_info.chat_id
+                message_id = msg_info.message_id
+                
+                if not from_chat_id or not message_id:
+                    logger.error(f"Неполная информация о сообщении: {msg_info}")
+                    continue
+                
+                # Результат заблаговременной проверки выбирает способ отправки сразу
+                status = source_prober.status(msg_info)
+                if status == PROBE_DEAD:
+                    # Недоступность могла быть временной: перед пропуском проверяем ещё раз
+                    status = await source_prober.recheck(bot, msg_info)
+                    if status == PROBE_DEAD:
+                        logger.warning(f"Исходное сообщение {i+1} недоступно и при повторной проверке, пропускаем")
                         continue
-                    
-                    logger.info(f"Отправка репоста {i+1}/{len(forwarded_messages_info)}: из чата {from_chat_id}, сообщение {message_id}")
-                    
-                    # Пробуем отправить репост
-                    await self.send_with_retry(
-                        bot,
-                        bot.forward_message,
-                        chat_id=chat_id,
-                        from_chat_id=from_chat_id,
-                        message_id=message_id
-                    )
-                    
-                    successful_sends += 1
-                    logger.info(f"Репост {i+1} успешно отправлен")
-                    
-                    # Небольшая задержка между сообщениями в группе
-                    if i < len(forwarded_messages_info) - 1:
-                        await asyncio.sleep(1)
+                
+                sent = False
+                if status != PROBE_COPY:
+                    try:
+                        logger.info(f"Отправка репоста {i+1}/{len(forwarded_messages_info)}: из чата {from_chat_id}, сообщение {message_id}")
                         
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке репоста {i+1}: {e}")
-                    
-                    # Пробуем альтернативный метод - копирование сообщения
+                        # Пробуем отправить репост
+                        await self.send_with_retry(
+                            bot,
+                            bot.forward_message,
+                            chat_id=chat_id,
+                            from_chat_id=from_chat_id,
+                            message_id=message_id
+                        )
+                        
+                        sent = True
+                        logger.info(f"Репост {i+1} успешно отправлен")
+                    except Exception as e:
+                        chat_cache.invalidate(from_chat_id)
+                        logger.error(f"Ошибка при отправке репоста {i+1}: {e}")
+                
+                if not sent:
+                    # Альтернативный метод - копирование сообщения
                     try:
                         logger.info(f"Пробуем скопировать сообщение {i+1} вместо репоста")
                         
-                        # Получаем оригинальное сообщение
-                        chat = await bot.get_chat(from_chat_id)
-                        
                         # Отправляем как копию (без указания авторства)
                         await self.send_with_retry(
                             bot,
@@ -263,10 +1193,24 @@ class PostScheduler:
                             message_id=message_id
                         )
                         
-                        successful_sends += 1
+                        sent = True
+                        source_prober.remember(msg_info, PROBE_COPY)
                         logger.info(f"Копия сообщения {i+1} успешно отправлена")
                     except Exception as copy_error:
+                        # Одна неудача не окончательна: следующая проверка определит статус заново
+                        chat_cache.invalidate(from_chat_id)
+                        source_prober.forget(msg_info)
                         logger.error(f"Не удалось скопировать сообщение {i+1}: {copy_error}")
+                
+                if sent:
+                    successful_sends += 1
+                    shutdown_coordinator.progress(i + 1)
+                    # Небольшая задержка между сообщениями в группе
+                    if i < len(forwarded_messages_info) - 1:
+                        with tracer.span("publish.sleep_between_messages"):
+                            await asyncio.sleep(1)
+            
+            shutdown_coordinator.progress(len(forwarded_messages_info))
             
             # Уведомляем пользователя о результате
             try:
@@ -304,63 +1248,890 @@ class PostScheduler:
             
         except Exception as e:
             logger.error(f"Критическая ошибка при отправке сообщения: {e}")
-async def restore_scheduled_jobs(app: Application):
-    """Восстановление запланированных заданий после перезапуска"""
-    logger.info("Восстановление запланированных заданий...")
+
+class BotRegistry:
+    """Объекты, которые задания планировщика получают в момент срабатывания"""
+    def __init__(self):
+        self.bot = None
     
-    moscow_tz = pytz.timezone('Europe/Moscow')
-    now = datetime.now(moscow_tz)
+    def bind(self, app: Application):
+        self.bot = app.bot
     
-    restored_count = 0
-    for post_id, post_data in scheduled_messages.items():
-        try:
-            # Получаем datetime из сохраненных данных
-            if 'datetime' in post_data:
-                if isinstance(post_data['datetime'], str):
-                    scheduled_datetime = datetime.fromisoformat(post_data['datetime'])
-                else:
-                    scheduled_datetime = post_data['datetime']
-                
-                # Проверяем, что время еще не прошло
-                if scheduled_datetime > now:
-                    # Добавляем bot в post_data
-                    post_data['bot'] = app.bot
-                    
-                    # Проверяем доступность исходных сообщений
-                    forwarded_info = post_data.get('forwarded_messages_info', [])
-                    if forwarded_info:
-                        first_msg = forwarded_info[0]
-                        try:
-                            # Пробуем получить информацию о чате
-                            chat = await app.bot.get_chat(first_msg.get('chat_id'))
-                            logger.info(f"Доступ к чату {chat.title if chat.title else chat.id} подтвержден")
-                        except Exception as e:
-                            logger.warning(f"Не удалось получить доступ к чату {first_msg.get('chat_id')}: {e}")
-                            logger.warning("Пост может не отправиться, если бот не имеет доступа к исходным сообщениям")
-                    
-                    trigger = DateTrigger(
-                        run_date=scheduled_datetime
-                    )
-                    
-                    scheduler.add_job(
-                        post_scheduler.send_scheduled_message,
-                        trigger=trigger,
-                        args=[GROUP_ID, post_data],
-                        id=f"post_{post_id}",
-                        replace_existing=True
-                    )
-                    restored_count += 1
-                    logger.info(f"Восстановлен пост {post_id} на {scheduled_datetime}")
-        except Exception as e:
-            logger.error(f"Ошибка восстановления поста {post_id}: {e}")
+    def get_bot(self):
+        if self.bot is None:
+            raise RuntimeError("Бот ещё не инициализирован")
+        return self.bot
     
-    logger.info(f"Восстановлено {restored_count} запланированных постов")
+    def get_post(self, post_id: str) -> Optional[ScheduledPost]:
+        return scheduled_messages.get(post_id)
+
+registry = BotRegistry()
+
 # Создание экземпляра планировщика
 post_scheduler = PostScheduler()
 
-async def is_admin(user_id: int) -> bool:
-    """Проверка, является ли пользователь администратором"""
-    return user_id in ADMINS
+async def publish_post(post_id: str, start: int = 0):
+    """Задание публикации: хранит только ID поста (и позицию продолжения после остановки)"""
+    if shutdown_coordinator.stopping:
+        # Задание успело сработать во время остановки — откладываем до перезапуска
+        shutdown_coordinator.checkpoint(post_id, start)
+        return
+    with shutdown_coordinator.publishing(post_id, start), tracer.span("publish", post_id=post_id):
+        await post_scheduler.send_scheduled_message(post_id, start)
+
+def post_job_id(post_id: str) -> str:
+    return f"post_{post_id}"
+
+def schedule_post_job(post: ScheduledPost, start: int = 0, run_date: Optional[datetime] = None):
+    """Поставить публикацию поста в планировщик"""
+    scheduler.add_job(
+        publish_post,
+        trigger=DateTrigger(run_date=run_date or post.scheduled_at),
+        args=[post.id, start] if start else [post.id],
+        id=post_job_id(post.id),
+        jobstore=POSTS_JOBSTORE,
+        misfire_grace_time=POST_MISFIRE_GRACE_TIME,
+        coalesce=True,
+        replace_existing=True
+    )
+
+def unschedule_post_job(post_id: str) -> bool:
+    """Снять публикацию с планировщика; False, если задания уже нет"""
+    try:
+        scheduler.remove_job(post_job_id(post_id), jobstore=POSTS_JOBSTORE)
+        return True
+    except JobLookupError:
+        return False
+
+class ShutdownCoordinator:
+    """Плавная остановка: планировщик перестаёт запускать задания, начатые публикации
+    дорабатывают до срока, недоделанные возвращаются в хранилище заданий с позиции
+    прерывания, фоновые задачи отменяются, данные записываются последним шагом."""
+    
+    def __init__(self, drain_timeout: float):
+        self.drain_timeout = drain_timeout
+        self.stopping = False
+        self.flushed = False
+        self.publishes: Dict[asyncio.Task, List] = {}  # задача -> [post_id, отправлено сообщений]
+        self.background: Set[asyncio.Task] = set()
+    
+    @contextmanager
+    def publishing(self, post_id: str, start: int):
+        """Учёт публикации, выполняемой текущей задачей"""
+        task = asyncio.current_task()
+        self.publishes[task] = [post_id, start]
+        try:
+            yield
+        except asyncio.CancelledError:
+            # Отмена при остановке ожидаема: позиция уже сохранена в контрольной точке
+            if not self.stopping:
+                raise
+        finally:
+            self.publishes.pop(task, None)
+    
+    def progress(self, sent: int):
+        """Сколько сообщений текущей публикации уже обработано"""
+        entry = self.publishes.get(asyncio.current_task())
+        if entry:
+            entry[1] = sent
+    
+    @contextmanager
+    def background_task(self):
+        """Учёт фоновой задачи, которую при остановке можно просто отменить"""
+        task = asyncio.current_task()
+        self.background.add(task)
+        try:
+            yield
+        except asyncio.CancelledError:
+            if not self.stopping:
+                raise
+        finally:
+            self.background.discard(task)
+    
+    def checkpoint(self, post_id: str, sent: int):
+        """Вернуть прерванную публикацию в хранилище заданий; после перезапуска она продолжится
+        с первого неотправленного сообщения (в пределах POST_MISFIRE_GRACE_TIME)"""
+        post = scheduled_messages.get(post_id)
+        # Все сообщения уже ушли — осталось лишь уведомление, повторять его после перезапуска не нужно
+        if post is None or sent >= len(post.messages):
+            return
+        try:
+            schedule_post_job(post, start=sent, run_date=datetime.now(MOSCOW_TZ))
+            logger.warning(f"Публикация {post_id} прервана остановкой после {sent}/{len(post.messages)} сообщений, продолжится после перезапуска")
+        except Exception as e:
+            logger.error(f"Не удалось сохранить прерванную публикацию {post_id}: {e}")
+    
+    async def shutdown(self):
+        """Остановка до закрытия HTTP-клиента бота"""
+        if self.stopping:
+            return
+        self.stopping = True
+        started = time.monotonic()
+        
+        # Новые задания не запускаются, хранилище заданий остаётся доступным для контрольных точек
+        if scheduler.running:
+            scheduler.pause()
+        
+        background = list(self.background)
+        for task in background:
+            task.cancel()
+        
+        # Фоновые уведомления и ожидающая сводка предложений дорабатывают в том же сроке, что и публикации
+        notification_dispatcher.flush_digest_now()
+        pending = set(self.publishes) | notification_dispatcher.tasks
+        if pending:
+            logger.info(f"Ожидание завершения публикаций и рассылок: {len(pending)} (не более {self.drain_timeout} с)")
+            _, pending = await asyncio.wait(pending, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+            if task in self.publishes:
+                self.checkpoint(*self.publishes[task])
+        await asyncio.gather(*background, *pending, return_exceptions=True)
+        
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        self.flush()
+        logger.info(f"Остановка завершена за {time.monotonic() - started:.1f} с: "
+                    f"отменено фоновых задач {len(background)}, прервано публикаций и рассылок {len(pending)}")
+    
+    def flush(self):
+        """Окончательная атомарная запись данных (однократно)"""
+        if self.flushed:
+            return
+        self.flushed = True
+        save_data()
+
+shutdown_coordinator = ShutdownCoordinator(SHUTDOWN_DRAIN_TIMEOUT)
+
+def bulk_delete_posts(post_ids: List[str]) -> int:
+    """Удалить набор постов пакетом, с одним сохранением"""
+    deleted = 0
+    for post_id in post_ids:
+        if post_id not in scheduled_messages:
+            continue
+        unschedule_post_job(post_id)
+        remove_scheduled_post(post_id)
+        deleted += 1
+    if deleted:
+        save_data()
+    return deleted
+
+def bulk_shift_posts(post_ids: List[str], delta: timedelta) -> Tuple[int, int]:
+    """Сдвинуть набор постов на delta пакетом, с одним сохранением.
+    Уже опубликованные посты, посты, которые после сдвига оказались бы в прошлом,
+    и сдвиги на время, где уже стоит такой же пост, пропускаются. Возвращает (сдвинуто, пропущено)."""
+    now = datetime.now(MOSCOW_TZ)
+    shifted = skipped = 0
+    # Посты пакета сдвигаются вместе: их старые слоты занятыми не считаются
+    batch = set(post_ids)
+    for post_id in post_ids:
+        post = scheduled_messages.get(post_id)
+        if post is None or not post.scheduled_at:
+            continue
+        # Опубликованные посты остаются в хранилище: новое задание опубликовало бы их повторно
+        if post.scheduled_at <= now:
+            skipped += 1
+            continue
+        new_datetime = (post.scheduled_at + delta).astimezone(MOSCOW_TZ)
+        occupied = post_fingerprints.find(slot_fingerprints(record_fingerprints(post), new_datetime)) - batch
+        if new_datetime <= now or occupied:
+            skipped += 1
+            continue
+        # Время входит в ключи индексов: пост переиндексируется целиком
+        remove_scheduled_post(post_id)
+        post.scheduled_at = new_datetime
+        post.time = new_datetime.strftime('%H:%M')
+        add_scheduled_post(post)
+        schedule_post_job(post)
+        shifted += 1
+    if shifted:
+        save_data()
+    return shifted, skipped
+
+def parse_day(text: str):
+    """Дата из «дд.мм» или «дд.мм.гггг» (без года — ближайшая будущая)"""
+    parts = [int(part) for part in text.split('.')]
+    today = datetime.now(MOSCOW_TZ).date()
+    if len(parts) == 3:
+        day, month, year = parts
+    else:
+        day, month = parts
+        year = today.year + 1 if month < today.month else today.year
+    return datetime(year, month, day).date()
+
+def select_posts(kind: str, value: str) -> List[str]:
+    """ID постов по условию: date <дд.мм[.гггг]>, source <текст>, suggester <id>"""
+    if kind == 'date':
+        start = MOSCOW_TZ.localize(datetime.combine(parse_day(value), datetime.min.time()))
+        return post_index.range(start, start + timedelta(days=1))
+    if kind == 'source':
+        return post_index.ids('source', value)
+    if kind == 'suggester':
+        return post_index.ids('original_suggester', int(value))
+    raise ValueError(f"Неизвестное условие: {kind}")
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка для каждого пользователя.
+    Общий семафор PTB берётся раньше do_process_update, поэтому он снят (sys.maxsize),
+    а ограничение параллельности берётся уже после блокировки пользователя: очередь
+    одного пользователя не занимает слоты, нужные остальным."""
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiters: Dict[int, int] = {}
+    
+    @asynccontextmanager
+    async def user_lock(self, user_id: Optional[int]):
+        """Эксклюзивный доступ к сессии пользователя"""
+        if user_id is None:
+            yield
+            return
+        
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            # Удаляем блокировку, когда её больше никто не ждёт
+            self._waiters[user_id] -= 1
+            if not self._waiters[user_id]:
+                del self._waiters[user_id]
+                del self._locks[user_id]
+    
+    async def do_process_update(self, update, coroutine):
+        """Обновления одного пользователя выполняются строго по очереди"""
+        user = update.effective_user if isinstance(update, Update) else None
+        async with self.user_lock(user.id if user else None):
+            async with self._slots:
+                with tracer.span(update_span_name(update)):
+                    await coroutine
+    
+    async def initialize(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+
+update_processor = PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES)
+
+def update_span_name(update) -> str:
+    """Имя интервала трассировки для обработчика обновления"""
+    if isinstance(update, Update):
+        if update.callback_query:
+            return f"handler.callback.{(update.callback_query.data or '').split('_')[0]}"
+        if update.message:
+            text = update.message.text or ''
+            return f"handler.command.{text.split()[0][1:]}" if text.startswith('/') else "handler.message"
+    return "handler.update"
+
+def schedule_followup(user_id: int, delay: float, func, *args, job_id: Optional[str] = None):
+    """Запланировать отложенное действие вместо ожидания внутри обработчика"""
+    scheduler.add_job(
+        run_followup,
+        trigger=DateTrigger(run_date=datetime.now(scheduler.timezone) + timedelta(seconds=delay)),
+        args=[user_id, func, *args],
+        id=job_id,
+        replace_existing=job_id is not None,
+        misfire_grace_time=None,
+        jobstore=MEMORY_JOBSTORE
+    )
+
+def redraw_job_id(message) -> str:
+    """ID задания перерисовки конкретного сообщения"""
+    return f"redraw_{message.chat.id}_{message.message_id}"
+
+def defer_redraw(query, delay: float, func, *args):
+    """Отложенная перерисовка сообщения без удержания обработчика.
+    Повторные перерисовки одного сообщения схлопываются в одну (последнюю)."""
+    schedule_followup(query.from_user.id, delay, func, *args, job_id=redraw_job_id(query.message))
+
+def cancel_deferred_redraw(message):
+    """Отмена отложенной перерисовки, если пользователь уже нажал новую кнопку"""
+    try:
+        scheduler.remove_job(redraw_job_id(message), jobstore=MEMORY_JOBSTORE)
+    except JobLookupError:
+        pass
+
+async def run_followup(user_id: int, func, *args):
+    """Выполнение отложенного действия под блокировкой пользователя"""
+    try:
+        with shutdown_coordinator.background_task():
+            async with update_processor.user_lock(user_id):
+                with tracer.span(f"followup.{getattr(func, '__name__', 'call')}"):
+                    await func(*args)
+    except Exception as e:
+        logger.error(f"Ошибка отложенного действия {getattr(func, '__name__', func)}: {e}")
+
+class RateLimiter:
+    """Ограничение частоты запросов к API (не чаще rate в секунду)"""
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def wait(self):
+        """Дождаться свободного слота для отправки"""
+        # Слот резервируется под блокировкой, ожидание идёт уже без неё,
+        # поэтому параллельные отправки не выстраиваются в очередь за чужим сном
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class SubmissionLimiter:
+    """Ограничение предложений от одного пользователя.
+    Всплески сдерживает корзина токенов, суточную квоту — скользящее окно из двух
+    счётчиков (текущий и предыдущий интервал), поэтому память на пользователя постоянна."""
+    
+    def __init__(self, burst: int, refill_seconds: float, daily_quota: int, window: float = 86400):
+        self.burst = burst
+        self.refill_rate = 1.0 / refill_seconds
+        self.daily_quota = daily_quota
+        self.window = window
+        self.buckets: Dict[int, List[float]] = {}   # user_id -> [токены, время обновления]
+        self.windows: Dict[int, List[float]] = {}   # user_id -> [начало окна, предыдущее, текущее]
+        self.warned: Set[int] = set()
+    
+    def take_token(self, user_id: int, now: Optional[float] = None) -> bool:
+        """Списать попытку из корзины пользователя"""
+        now = time.time() if now is None else now
+        bucket = self.buckets.setdefault(user_id, [float(self.burst), now])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.refill_rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        self.warned.discard(user_id)
+        return True
+    
+    def retry_after(self, user_id: int) -> int:
+        """Секунд до следующей попытки"""
+        bucket = self.buckets.get(user_id)
+        if not bucket or bucket[0] >= 1:
+            return 0
+        return math.ceil((1 - bucket[0]) / self.refill_rate)
+    
+    def _window(self, user_id: int, now: float) -> List[float]:
+        """Счётчики пользователя, сдвинутые к текущему интервалу"""
+        start = now - now % self.window
+        counters = self.windows.get(user_id)
+        if counters is None or counters[0] < start - self.window:
+            counters = self.windows[user_id] = [start, 0, 0]
+        elif counters[0] < start:
+            counters[:] = [start, counters[2], 0]
+        return counters
+    
+    def used(self, user_id: int, now: Optional[float] = None) -> float:
+        """Оценка числа предложений за последние сутки"""
+        now = time.time() if now is None else now
+        start, previous, current = self._window(user_id, now)
+        return previous * (1 - (now - start) / self.window) + current
+    
+    def quota_left(self, user_id: int, now: Optional[float] = None) -> int:
+        return max(0, math.floor(self.daily_quota - self.used(user_id, now)))
+    
+    def count_submission(self, user_id: int, now: Optional[float] = None) -> bool:
+        """Учесть предложение, если суточная квота ещё не исчерпана"""
+        now = time.time() if now is None else now
+        if self.used(user_id, now) + 1 > self.daily_quota:
+            return False
+        self.windows[user_id][2] += 1
+        return True
+    
+    def should_warn(self, user_id: int) -> bool:
+        """Предупреждать об ограничении один раз, пока пользователь не получит новую попытку"""
+        if user_id in self.warned:
+            return False
+        self.warned.add(user_id)
+        return True
+    
+    def prune(self, now: Optional[float] = None) -> int:
+        """Удалить пользователей с полной корзиной и пустым окном"""
+        now = time.time() if now is None else now
+        idle = [uid for uid, (tokens, last) in self.buckets.items()
+                if tokens + (now - last) * self.refill_rate >= self.burst]
+        for uid in idle:
+            del self.buckets[uid]
+            self.warned.discard(uid)
+        start = now - now % self.window
+        expired = [uid for uid, counters in self.windows.items()
+                   if counters[0] < start - self.window or not (counters[1] or counters[2])]
+        for uid in expired:
+            del self.windows[uid]
+        return len(idle) + len(expired)
+
+submission_limiter = SubmissionLimiter(SUBMIT_BURST, SUBMIT_REFILL_SECONDS, SUGGESTION_DAILY_QUOTA)
+
+class NotificationDispatcher:
+    """Параллельная рассылка уведомлений с ограничением частоты и сводками"""
+    def __init__(self, rate: float, digest_interval: float):
+        self.limiter = RateLimiter(rate)
+        self.digest_interval = digest_interval
+        self.pending_suggestions: List[str] = []
+        self.bot = None
+        self.tasks: Set[asyncio.Task] = set()
+    
+    async def _send(self, bot, chat_id: int, text: str):
+        await self.limiter.wait()
+        await post_scheduler.send_with_retry(bot, bot.send_message, chat_id=chat_id, text=text)
+    
+    async def send_many(self, bot, messages: List[tuple]):
+        """Отправить пачку сообщений (chat_id, text) параллельно"""
+        results = await asyncio.gather(
+            *(self._send(bot, chat_id, text) for chat_id, text in messages),
+            return_exceptions=True
+        )
+        failed = 0
+        for (chat_id, _), result in zip(messages, results):
+            if isinstance(result, Exception):
+                failed += 1
+                logger.warning(f"Не удалось отправить уведомление {chat_id}: {result}")
+        return len(messages) - failed
+    
+    def send_background(self, bot, messages: List[tuple]):
+        """Разослать пачку сообщений фоновой задачей, не задерживая обработчик"""
+        if not messages:
+            return
+        self._track(self.send_many(bot, messages))
+    
+    def _track(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+    
+    def flush_digest_now(self):
+        """Разослать накопленную сводку сразу (при остановке: её задание живёт только в памяти)"""
+        if self.pending_suggestions:
+            self._track(self.flush_digest())
+    
+    async def notify_admins(self, bot, text: str):
+        """Отправить одно сообщение всем, кто рассматривает предложения"""
+        return await self.send_many(bot, [(staff_id, text) for staff_id in access.with_permission(PERM_REVIEW)])
+    
+    def queue_suggestion(self, bot, suggestion_id: str):
+        """Добавить предложение в ближайшую сводку для администраторов"""
+        self.bot = bot
+        self.pending_suggestions.append(suggestion_id)
+        if not scheduler.get_job("suggestion_digest", jobstore=MEMORY_JOBSTORE):
+            scheduler.add_job(
+                self.flush_digest,
+                trigger=DateTrigger(
+                    run_date=datetime.now(scheduler.timezone) + timedelta(seconds=self.digest_interval)
+                ),
+                id="suggestion_digest",
+                misfire_grace_time=None,
+                jobstore=MEMORY_JOBSTORE
+            )
+    
+    async def flush_digest(self):
+        """Разослать сводку накопленных предложений всем администраторам"""
+        pending = [suggestions[sid] for sid in self.pending_suggestions if sid in suggestions]
+        self.pending_suggestions = []
+        if not pending or not self.bot:
+            return
+        
+        if len(pending) == 1:
+            sugg = pending[0]
+            media_info = "📸 Медиа-группа" if sugg.is_media_group else "📝 Сообщение"
+            text = (
+                f"📨 Новое предложение ({media_info}) от пользователя {sugg.user_info}!\n"
+                f"📅 Дат: {len(sugg.selected_dates)}, ⏰ Время: {len(sugg.selected_times)} вариантов\n"
+                f"Используйте /start для просмотра предложений."
+            )
+        else:
+            text = f"📨 Новых предложений: {len(pending)}\n\n"
+            for sugg in pending[:10]:
+                media_info = "📸" if sugg.is_media_group else "📝"
+                text += f"{media_info} {sugg.user_info} — {sugg.source[:30]}\n"
+            if len(pending) > 10:
+                text += f"…и ещё {len(pending) - 10}\n"
+            text += "\nИспользуйте /start для просмотра предложений."
+        
+        sent = await self.notify_admins(self.bot, text)
+        logger.info(f"Сводка по {len(pending)} предложениям отправлена {sent}/{len(access.with_permission(PERM_REVIEW))} сотрудникам")
+
+notification_dispatcher = NotificationDispatcher(NOTIFY_RATE_LIMIT, SUGGESTION_DIGEST_INTERVAL)
+
+class ChatMetadataCache:
+    """Общий кэш метаданных чатов (get_chat) с TTL.
+    None — нет доступа к чату (хранится недолго); запись сбрасывается при ошибке отправки
+    из этого чата и при изменении членства бота в нём."""
+    def __init__(self, ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._chats: Dict[int, Tuple[Any, float]] = {}
+        self._pending: Dict[int, asyncio.Task] = {}
+    
+    async def get(self, bot, chat_id: int):
+        """Чат из кэша; одновременные запросы одного чата объединяются в один вызов API"""
+        entry = self._chats.get(chat_id)
+        if entry and time.monotonic() - entry[1] < (self.ttl if entry[0] is not None else self.negative_ttl):
+            return entry[0]
+        task = self._pending.get(chat_id)
+        if task is None:
+            task = self._pending[chat_id] = asyncio.ensure_future(self._fetch(bot, chat_id))
+        return await task
+    
+    async def _fetch(self, bot, chat_id: int):
+        try:
+            chat = await bot.get_chat(chat_id)
+        except (BadRequest, Forbidden) as e:
+            logger.warning(f"Нет доступа к чату {chat_id}: {e}")
+            chat = None
+        finally:
+            self._pending.pop(chat_id, None)
+        # Сетевые ошибки не кэшируются: исключение уходит вызывающему
+        self._chats[chat_id] = (chat, time.monotonic())
+        return chat
+    
+    def invalidate(self, chat_id: int):
+        self._chats.pop(chat_id, None)
+
+chat_cache = ChatMetadataCache(CHAT_CACHE_TTL, CHAT_CACHE_NEGATIVE_TTL)
+
+# Способ отправки исходного сообщения по результатам проверки
+PROBE_FORWARD = 'forward'
+PROBE_COPY = 'copy'
+PROBE_DEAD = 'dead'
+
+class SourceProber:
+    """Заблаговременная проверка исходных сообщений предстоящих постов с кэшем результатов"""
+    def __init__(self, ttl: float, horizon: float):
+        self.ttl = ttl
+        self.horizon = horizon
+        self.limiter = RateLimiter(NOTIFY_RATE_LIMIT)
+        self._cache: Dict[tuple, Tuple[str, float]] = {}
+        self._warned: Set[str] = set()
+    
+    def status(self, msg: MessageRef) -> Optional[str]:
+        """Актуальный результат проверки или None"""
+        entry = self._cache.get((msg.chat_id, msg.message_id))
+        if entry and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+    
+    def remember(self, msg: MessageRef, status: str):
+        self._cache[(msg.chat_id, msg.message_id)] = (status, time.monotonic())
+    
+    def forget(self, msg: MessageRef):
+        self._cache.pop((msg.chat_id, msg.message_id), None)
+    
+    def forget_chat(self, chat_id: int):
+        """Сбросить результаты по всем сообщениям чата"""
+        self._cache = {key: entry for key, entry in self._cache.items() if key[0] != chat_id}
+    
+    async def recheck(self, bot, msg: MessageRef) -> Optional[str]:
+        """Повторная проверка перед публикацией; при сетевой ошибке статус неизвестен (None)"""
+        try:
+            status = await self.probe_message(bot, msg)
+        except Exception as e:
+            logger.warning(f"Не удалось повторно проверить сообщение {msg.message_id} из чата {msg.chat_id}: {e}")
+            self.forget(msg)
+            return None
+        self.remember(msg, status)
+        return status
+    
+    async def probe_message(self, bot, msg: MessageRef) -> str:
+        """Проверка одного сообщения: доступ к чату, затем пробная пересылка или копия"""
+        if await chat_cache.get(bot, msg.chat_id) is None:
+            return PROBE_DEAD
+        if PROBE_CHAT_ID is None:
+            return PROBE_FORWARD
+        
+        for method, status in ((bot.forward_message, PROBE_FORWARD), (bot.copy_message, PROBE_COPY)):
+            try:
+                probe = await method(
+                    chat_id=PROBE_CHAT_ID,
+                    from_chat_id=msg.chat_id,
+                    message_id=msg.message_id,
+                    disable_notification=True
+                )
+            except Exception:
+                continue
+            try:
+                await bot.delete_message(PROBE_CHAT_ID, probe.message_id)
+            except Exception:
+                pass
+            return status
+        return PROBE_DEAD
+    
+    async def probe_upcoming(self):
+        """Проверить источники постов, которые выйдут в ближайшие horizon секунд"""
+        bot = registry.bot
+        if bot is None:
+            return
+        
+        now = datetime.now(MOSCOW_TZ)
+        post_ids = post_index.range(now, now + timedelta(seconds=self.horizon))
+        
+        # Устаревшие результаты и предупреждения по уже ушедшим постам больше не нужны
+        checked_before = time.monotonic() - self.ttl
+        self._cache = {key: entry for key, entry in self._cache.items() if entry[1] >= checked_before}
+        self._warned &= scheduled_messages.keys()
+        
+        pending = {}
+        for post_id in post_ids:
+            for msg in scheduled_messages[post_id].messages:
+                if self.status(msg) is None:
+                    pending[(msg.chat_id, msg.message_id)] = msg
+        
+        for msg in pending.values():
+            await self.limiter.wait()
+            try:
+                self.remember(msg, await self.probe_message(bot, msg))
+            except Exception as e:
+                # Сетевая ошибка: повторим при следующей проверке
+                logger.warning(f"Не удалось проверить сообщение {msg.message_id} из чата {msg.chat_id}: {e}")
+        
+        warnings = []
+        for post_id in post_ids:
+            post = scheduled_messages.get(post_id)
+            if post is None or post_id in self._warned:
+                continue
+            dead = sum(1 for msg in post.messages if self.status(msg) == PROBE_DEAD)
+            if not dead:
+                continue
+            self._warned.add(post_id)
+            post_date = post.date.strftime('%d.%m.%Y') if post.date else '—'
+            logger.warning(f"Пост {post_id}: недоступно исходных сообщений {dead}/{len(post.messages)}")
+            warnings.append((post.user_id, (
+                f"⚠️ Пост на {post_date} в {post.time} ({post.source[:30]}) может не выйти: "
+                f"недоступно исходных сообщений {dead}/{len(post.messages)}.\n"
+                f"Возможно, сообщение удалено или у бота нет доступа к каналу."
+            )))
+        
+        if warnings:
+            await notification_dispatcher.send_many(bot, warnings)
+        if pending:
+            logger.info(f"Проверено исходных сообщений: {len(pending)}, предупреждений: {len(warnings)}")
+
+source_prober = SourceProber(SOURCE_PROBE_TTL, SOURCE_PROBE_HORIZON)
+
+async def probe_sources_job():
+    """Периодическая проверка источников (отменяется при остановке)"""
+    with shutdown_coordinator.background_task():
+        await source_prober.probe_upcoming()
+
+def purge_expired() -> int:
+    """Удалить устаревшие предложения и отменить их публикации"""
+    now = datetime.now(pytz.utc)
+    purged = 0
+    for kind, record_id in expiry_index.pop_expired(now):
+        # Записи могли быть удалены или изменены раньше: проверяем актуальное состояние
+        store = suggestions if kind == 'suggestion' else scheduled_messages
+        record = store.get(record_id)
+        if record is None or not is_expired(record):
+            continue
+        if kind == 'suggestion':
+            remove_suggestion(record_id)
+        else:
+            # Задания может уже не быть (публикация состоялась), но запись всё равно удаляется:
+            # её элемент в очереди сроков уже извлечён и больше не встретится
+            unschedule_post_job(record_id)
+            remove_scheduled_post(record_id)
+        purged += 1
+    
+    if purged:
+        save_data()
+        logger.info(f"Удалено устаревших записей: {purged}")
+    return purged
+
+async def purge_expired_job():
+    """Периодическая очистка устаревших сигналов и простаивающих ограничителей"""
+    purge_expired()
+    submission_limiter.prune()
+
+# Роли сотрудников
+ROLE_OWNER = 'owner'
+ROLE_ADMIN = 'admin'
+ROLE_MODERATOR = 'moderator'
+
+# Права
+PERM_REVIEW = 'review'      # рассмотрение предложений
+PERM_SCHEDULE = 'schedule'  # планирование постов и управление ими
+PERM_MANAGE = 'manage'      # назначение ролей и просмотр журнала
+
+ROLE_PERMISSIONS: Dict[str, FrozenSet[str]] = {
+    ROLE_OWNER: frozenset({PERM_REVIEW, PERM_SCHEDULE, PERM_MANAGE}),
+    ROLE_ADMIN: frozenset({PERM_REVIEW, PERM_SCHEDULE, PERM_MANAGE}),
+    ROLE_MODERATOR: frozenset({PERM_REVIEW}),
+}
+
+ROLE_TITLES = {
+    ROLE_OWNER: "👑 владелец",
+    ROLE_ADMIN: "🛡 администратор",
+    ROLE_MODERATOR: "🔎 модератор",
+}
+
+NO_PERMISSIONS: FrozenSet[str] = frozenset()
+
+class AccessControl:
+    """Роли сотрудников с журналом изменений.
+    Права пользователя вычисляются при смене роли, проверка — один поиск в словаре.
+    Каждое изменение дописывается в журнал одной строкой; состояние — результат его воспроизведения."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.roles: Dict[int, str] = {}
+        self.permissions: Dict[int, FrozenSet[str]] = {}
+        self.events: List[Dict] = []
+    
+    def has(self, user_id: int, permission: str) -> bool:
+        return permission in self.permissions.get(user_id, NO_PERMISSIONS)
+    
+    def role(self, user_id: int) -> Optional[str]:
+        return self.roles.get(user_id)
+    
+    def members(self, *roles: str) -> List[int]:
+        """Сотрудники с указанными ролями (все сотрудники, если роли не заданы)"""
+        return sorted(uid for uid, role in self.roles.items() if not roles or role in roles)
+    
+    def with_permission(self, permission: str) -> List[int]:
+        return sorted(uid for uid, perms in self.permissions.items() if permission in perms)
+    
+    def apply(self, event: Dict):
+        """Применить событие журнала к текущим ролям"""
+        user_id = event['user']
+        if event['action'] == 'grant':
+            self.roles[user_id] = event['role']
+            self.permissions[user_id] = ROLE_PERMISSIONS[event['role']]
+        else:
+            self.roles.pop(user_id, None)
+            self.permissions.pop(user_id, None)
+        self.events.append(event)
+    
+    def record(self, actor: int, action: str, user_id: int, role: str):
+        """Дописать событие в журнал и применить его"""
+        event = {
+            'ts': datetime.now(MOSCOW_TZ).isoformat(timespec='seconds'),
+            'actor': actor,
+            'action': action,
+            'user': user_id,
+            'role': role,
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.apply(event)
+        logger.info(f"Роли: {actor} {action} {user_id} ({role})")
+    
+    def replay(self) -> int:
+        """Восстановить роли из журнала; оборванная при сбое последняя строка отбрасывается"""
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        if raw and not raw.endswith(b'\n'):
+            # Иначе следующее событие допишется в ту же строку
+            cut = raw.rfind(b'\n') + 1
+            logger.warning(f"{self.path}: отброшена неполная запись в конце журнала")
+            with open(self.path, 'r+b') as f:
+                f.truncate(cut)
+            raw = raw[:cut]
+        
+        for number, line in enumerate(raw.decode('utf-8').splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+                if event['action'] not in ('grant', 'revoke') or event['role'] not in ROLE_PERMISSIONS:
+                    raise ValueError(f"неизвестное событие {event['action']}/{event['role']}")
+                self.apply(event)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"{self.path}:{number}: пропущена запись журнала: {e}")
+        return len(self.events)
+    
+    def load(self, bootstrap_admins: Set[int]):
+        """Роли из журнала; без журнала — начальный состав из снимка"""
+        self.roles, self.permissions, self.events = {}, {}, []
+        if os.path.exists(self.path) and self.replay():
+            logger.info(f"Роли восстановлены из журнала: {len(self.events)} событий, {len(self.roles)} сотрудников")
+            return
+        
+        self.record(0, 'grant', INITIAL_ADMIN_ID, ROLE_OWNER)
+        for admin_id in sorted(bootstrap_admins - {INITIAL_ADMIN_ID}):
+            self.record(0, 'grant', admin_id, ROLE_ADMIN)
+        logger.info(f"Журнал ролей создан: {len(self.roles)} сотрудников")
+    
+    def grant(self, actor: int, user_id: int, role: str) -> bool:
+        """Назначить роль; роль владельца не меняется"""
+        if self.roles.get(user_id) in (role, ROLE_OWNER):
+            return False
+        self.record(actor, 'grant', user_id, role)
+        return True
+    
+    def revoke(self, actor: int, user_id: int) -> Optional[str]:
+        """Снять роль; возвращает снятую роль. Владельца снять нельзя"""
+        role = self.roles.get(user_id)
+        if role is None or role == ROLE_OWNER:
+            return None
+        self.record(actor, 'revoke', user_id, role)
+        return role
+    
+    def history(self, user_id: Optional[int] = None, limit: int = AUDIT_VIEW_LIMIT) -> List[Dict]:
+        """Последние события журнала (по пользователю — как цели или как автора)"""
+        events = self.events
+        if user_id is not None:
+            events = [e for e in events if user_id in (e['user'], e['actor'])]
+        return events[-limit:]
+
+access = AccessControl(AUDIT_LOG_FILE)
+
+def is_admin(user_id: int) -> bool:
+    """Проверка, может ли пользователь планировать посты (владелец или администратор)"""
+    return access.has(user_id, PERM_SCHEDULE)
+
+def can_review(user_id: int) -> bool:
+    """Проверка, может ли пользователь рассматривать предложения (включая модераторов)"""
+    return access.has(user_id, PERM_REVIEW)
+
+def can_manage(user_id: int) -> bool:
+    """Проверка, может ли пользователь назначать роли"""
+    return access.has(user_id, PERM_MANAGE)
+
+def main_menu_keyboard(user_id: int) -> List[List[InlineKeyboardButton]]:
+    """Кнопки главного меню в зависимости от роли"""
+    if is_admin(user_id):
+        return [
+            [InlineKeyboardButton("📅 Запланировать пост", callback_data="schedule_post")],
+            [InlineKeyboardButton("📋 Все запланированные посты", callback_data="my_posts_1")],
+            [InlineKeyboardButton("👥 Управление администраторами", callback_data="manage_admins")],
+            [InlineKeyboardButton("📨 Предложения от пользователей", callback_data="view_suggestions_1")],
+            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
+        ]
+    keyboard = [
+        [InlineKeyboardButton("📝 Предложить пост", callback_data="suggest_post")],
+        [InlineKeyboardButton("📋 Мои посты", callback_data="pv_my_1")],
+    ]
+    if can_review(user_id):
+        keyboard.append([InlineKeyboardButton("📨 Предложения от пользователей", callback_data="view_suggestions_1")])
+    keyboard.append([InlineKeyboardButton("❓ Помощь", callback_data="help")])
+    return keyboard
+
+def format_audit_event(event: Dict) -> str:
+    ts = datetime.fromisoformat(event['ts']).strftime('%d.%m.%Y %H:%M')
+    actor = "система" if event['actor'] == 0 else event['actor']
+    sign, verb = ("➕", "назначил") if event['action'] == 'grant' else ("➖", "снял")
+    return f"{sign} {ts} — {actor} {verb} {event['user']}: {ROLE_TITLES[event['role']]}"
+
+def audit_view(user_id: Optional[int] = None) -> str:
+    """Журнал изменений ролей и текущий состав, полученный его воспроизведением"""
+    events = access.history(user_id)
+    title = f"📜 Журнал ролей пользователя {user_id}" if user_id is not None else "📜 Журнал ролей"
+    text = f"{title} (последние {len(events)}):\n\n"
+    text += "\n".join(format_audit_event(e) for e in events) if events else "Событий нет"
+    
+    text += "\n\n👥 Текущие роли:\n"
+    members = [user_id] if user_id is not None else access.members()
+    for uid in members:
+        role = access.role(uid)
+        text += f"• {uid} — {ROLE_TITLES[role] if role else 'нет роли'}\n"
+    return text
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
@@ -376,22 +2147,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data:
         context.user_data.clear()
     
-    # Проверяем, является ли пользователь администратором
-    if await is_admin(user_id):
-        keyboard = [
-            [InlineKeyboardButton("📅 Запланировать пост", callback_data="schedule_post")],
-            [InlineKeyboardButton("📋 Все запланированные посты", callback_data="my_posts_1")],
-            [InlineKeyboardButton("👥 Управление администраторами", callback_data="manage_admins")],
-            [InlineKeyboardButton("📨 Предложения от пользователей", callback_data="view_suggestions_1")],
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-        ]
-    else:
-        keyboard = [
-            [InlineKeyboardButton("📝 Предложить пост", callback_data="suggest_post")],
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-        ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = InlineKeyboardMarkup(main_menu_keyboard(user_id))
     
     welcome_text = (
         "👋 Привет! Я бот для планирования публикаций.\n\n"
@@ -411,6 +2167,13 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode='Markdown'
     )
 
+async def handle_my_chat_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Бота добавили в чат, удалили или изменили его права: кэш доступа к чату устарел"""
+    chat_id = update.my_chat_member.chat.id
+    chat_cache.invalidate(chat_id)
+    source_prober.forget_chat(chat_id)
+    logger.info(f"Изменено членство бота в чате {chat_id}: {update.my_chat_member.new_chat_member.status}")
+
 async def ignore_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Игнорировать нажатие на кнопку"""
     await update.callback_query.answer()
@@ -426,8 +2189,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.message.chat.type != 'private':
         return
     
+    # Новое нажатие важнее запланированной перерисовки этого сообщения
+    cancel_deferred_redraw(query.message)
+    
     if query.data == "schedule_post":
-        if not await is_admin(user_id):
+        if not is_admin(user_id):
             await query.edit_message_text("❌ У вас нет прав администратора для этой операции.")
             return
         await query.edit_message_text(
@@ -451,44 +2217,61 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return SELECTING_DATES
     
     elif query.data == "manage_admins":
-        if not await is_admin(user_id):
+        if not can_manage(user_id):
             await query.edit_message_text("❌ У вас нет прав для этой операции.")
             return
         await show_admin_management(query)
     
     elif query.data.startswith("view_suggestions_"):
-        if not await is_admin(user_id):
+        if not can_review(user_id):
             return
         page = int(query.data.split('_')[2])
         await show_suggestions(query, user_id, page)
     
+    elif query.data.startswith("sig_"):
+        if not can_review(user_id):
+            return
+        _, min_percent, symbol, page = query.data.split('_')
+        await show_signal_suggestions(query, int(min_percent), None if symbol == '*' else symbol, int(page))
+    
+    elif query.data.startswith("rv_"):
+        if not can_review(user_id):
+            return
+        await handle_review_action(query, user_id)
+    
     elif query.data.startswith("approve_"):
-        if not await is_admin(user_id):
+        if not can_review(user_id):
             return
         suggestion_id = query.data.replace("approve_", "")
         await approve_suggestion(query, user_id, suggestion_id)
     
     elif query.data.startswith("reject_"):
-        if not await is_admin(user_id):
+        if not can_review(user_id):
             return
         suggestion_id = query.data.replace("reject_", "")
         await reject_suggestion(query, user_id, suggestion_id)
     
     elif query.data.startswith("my_posts_"):
-        if not await is_admin(user_id):
+        if not is_admin(user_id):
             await query.edit_message_text("❌ У вас нет прав для просмотра этой информации.")
             return
         page = int(query.data.split('_')[2])
         await show_user_posts(query, user_id, page)
     
+    elif query.data.startswith("pv_"):
+        await handle_post_view(query, user_id)
+    
+    elif query.data.startswith("pb_"):
+        await handle_post_bulk_action(query, user_id)
+    
     elif query.data.startswith("next_page_"):
-        if not await is_admin(user_id):
+        if not is_admin(user_id):
             return
         page = int(query.data.split('_')[2])
         await show_user_posts(query, user_id, page)
     
     elif query.data.startswith("prev_page_"):
-        if not await is_admin(user_id):
+        if not is_admin(user_id):
             return
         page = int(query.data.split('_')[2])
         await show_user_posts(query, user_id, page)
@@ -500,93 +2283,99 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await show_main_menu(query)
     
     elif query.data.startswith("delete_"):
-        if not await is_admin(user_id):
+        if not is_admin(user_id):
             await query.edit_message_text("❌ Только администраторы могут удалять посты.")
             return
         post_id = query.data.replace("delete_", "")
         if post_id in scheduled_messages:
-            try:
-                scheduler.remove_job(f"post_{post_id}")
-            except:
-                pass
-            del scheduled_messages[post_id]
+            unschedule_post_job(post_id)
+            remove_scheduled_post(post_id)
             save_data()
             await query.edit_message_text("✅ Пост успешно удален!")
-            await asyncio.sleep(1)
-            await show_main_menu(query)
+            defer_redraw(query, 1, show_main_menu, query)
     
     elif query.data == "finish_dates":
         if user_id in user_sessions:
             if user_sessions[user_id].get('selected_dates'):
-                await show_count_selection(query, user_id)
-                return SELECTING_COUNT
+                await show_time_selection(query, user_id)
+                return SELECTING_TIMES
             else:
                 await query.edit_message_text("❌ Выберите хотя бы одну дату!")
                 return SELECTING_DATES
     
     elif query.data == "add_admin":
-        if not await is_admin(user_id):
+        if not can_manage(user_id):
             await query.edit_message_text("❌ У вас нет прав для этой операции.")
             return
         await query.edit_message_text(
-            "➕ Для добавления администратора:\n"
+            "➕ Для добавления администратора или модератора:\n"
             "1. Попросите пользователя отправить команду /id в боте\n"
-            "2. Отправьте команду /add_admin <id_пользователя>\n\n"
+            "2. Отправьте команду /add_admin <id_пользователя>\n"
+            "   или /add_moderator <id_пользователя>\n\n"
             "Например: /add_admin 123456789"
         )
     
     elif query.data == "remove_admin":
-        if not await is_admin(user_id):
+        if not can_manage(user_id):
             await query.edit_message_text("❌ У вас нет прав для этой операции.")
             return
         await show_remove_admin_list(query, user_id)
     
     elif query.data.startswith("remove_admin_"):
-        if not await is_admin(user_id):
+        if not can_manage(user_id):
             return
         admin_id_to_remove = int(query.data.replace("remove_admin_", ""))
         if admin_id_to_remove == user_id:
             await query.edit_message_text("❌ Нельзя удалить самого себя!")
             return
-        if admin_id_to_remove in ADMINS:
-            ADMINS.remove(admin_id_to_remove)
-            save_data()
-            await query.edit_message_text(f"✅ Администратор {admin_id_to_remove} удален")
-            await asyncio.sleep(1)
-            await show_admin_management(query)
+        if access.role(admin_id_to_remove) == ROLE_OWNER:
+            await query.edit_message_text("❌ Владельца бота удалить нельзя")
+        elif access.revoke(user_id, admin_id_to_remove) is None:
+            await query.edit_message_text("❌ Пользователь не является администратором или модератором")
+        else:
+            await query.edit_message_text(f"✅ Пользователь {admin_id_to_remove} удален из сотрудников")
+        defer_redraw(query, 1, show_admin_management, query)
     
     elif query.data == "list_admins":
-        if not await is_admin(user_id):
+        if not can_manage(user_id):
             return
         await show_admins_list(query)
+    
+    elif query.data == "audit_log":
+        if not can_manage(user_id):
+            return
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")]]
+        await query.edit_message_text(audit_view(), reply_markup=InlineKeyboardMarkup(keyboard))
 
 async def show_remove_admin_list(query, admin_id: int):
-    """Показать список админов для удаления"""
-    text = "👥 Выберите администратора для удаления:\n\n"
+    """Показать список сотрудников для удаления"""
+    text = "👥 Выберите сотрудника для удаления:\n\n"
     keyboard = []
     
-    for aid in ADMINS:
-        if aid != admin_id:  # Не показываем самого себя
-            text += f"• ID: {aid}\n"
+    # Не показываем самого себя и владельца
+    for aid in access.members(ROLE_ADMIN, ROLE_MODERATOR):
+        if aid != admin_id:
+            text += f"• ID: {aid} — {ROLE_TITLES[access.role(aid)]}\n"
             keyboard.append([InlineKeyboardButton(
                 f"❌ Удалить {aid}",
                 callback_data=f"remove_admin_{aid}"
             )])
     
     if not keyboard:
-        text = "👥 Нет других администраторов для удаления."
+        text = "👥 Нет других сотрудников для удаления."
     
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")])
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(text, reply_markup=reply_markup)
 
 async def show_admins_list(query):
-    """Показать список всех администраторов"""
-    text = "👥 Список администраторов:\n\n"
-    for aid in ADMINS:
-        text += f"• {aid}\n"
+    """Показать список всех сотрудников с ролями"""
+    text = "👥 Список сотрудников:\n\n"
+    staff = access.members()
+    for aid in staff:
+        text += f"• {aid} — {ROLE_TITLES[access.role(aid)]}\n"
     
-    text += f"\nВсего: {len(ADMINS)}"
+    text += f"\nВсего: {len(staff)}"
     
     keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="manage_admins")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -598,6 +2387,7 @@ async def show_admin_management(query):
         [InlineKeyboardButton("➕ Добавить администратора", callback_data="add_admin")],
         [InlineKeyboardButton("➖ Удалить администратора", callback_data="remove_admin")],
         [InlineKeyboardButton("📋 Список администраторов", callback_data="list_admins")],
+        [InlineKeyboardButton("📜 Журнал изменений", callback_data="audit_log")],
         [InlineKeyboardButton("🔙 Назад", callback_data="back_to_menu")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -609,6 +2399,8 @@ async def show_admin_management(query):
 
 async def show_suggestions(query, admin_id: int, page: int = 1):
     """Показать предложения от пользователей"""
+    purge_expired()
+    
     if not suggestions:
         keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -621,7 +2413,7 @@ async def show_suggestions(query, admin_id: int, page: int = 1):
     # Сортируем предложения по дате (новые сверху)
     sorted_suggestions = sorted(
         suggestions.items(),
-        key=lambda x: x[1].get('created_at', ''),
+        key=lambda x: x[1].created_at,
         reverse=True
     )
     
@@ -638,18 +2430,20 @@ async def show_suggestions(query, admin_id: int, page: int = 1):
     
     for i in range(start_idx, end_idx):
         sugg_id, sugg = sorted_suggestions[i]
-        user_info = sugg.get('user_info', 'Неизвестно')
-        created_at = sugg.get('created_at', '')
-        dates = ', '.join(sugg.get('selected_dates', []))
-        times = ', '.join(sugg.get('selected_times', []))
+        user_info = sugg.user_info
+        created_at = sugg.created_at.strftime('%d.%m.%Y %H:%M')
+        dates = ', '.join(sugg.selected_dates)
+        times = ', '.join(sugg.selected_times)
         
-        media_info = "📸 Медиа-группа" if sugg.get('is_media_group') else "📝 Одиночное сообщение"
+        media_info = "📸 Медиа-группа" if sugg.is_media_group else "📝 Одиночное сообщение"
         
         text += f"📝 От: {user_info}\n"
         text += f"🆔 ID: {sugg_id[:8]}...\n"
+        if sugg.signal:
+            text += f"📈 {signal_summary(sugg.signal)}\n"
         text += f"📅 Даты: {dates}\n"
         text += f"⏰ Время: {times}\n"
-        text += f"📊 Постов в день: {sugg.get('post_count')}\n"
+        text += f"📊 Постов в день: {sugg.post_count}\n"
         text += f"📌 {media_info}\n"
         text += f"📅 Создано: {created_at}\n\n"
         
@@ -669,11 +2463,159 @@ async def show_suggestions(query, admin_id: int, page: int = 1):
     if nav_row:
         keyboard.append(nav_row)
     
+    keyboard.append([InlineKeyboardButton("🗂 Пакетная модерация", callback_data="rv_page_1")])
+    keyboard.append([InlineKeyboardButton("📈 Сигналы по вероятности", callback_data="sig_0_*_1")])
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_menu")])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(text, reply_markup=reply_markup)
 
+def signal_summary(signal: TradingSignal) -> str:
+    """Краткое описание сигнала в одну строку"""
+    parts = [f"{signal.side} {signal.symbol}"]
+    if signal.probability is not None:
+        parts.append(f"вероятность {signal.probability:.2f}")
+    if signal.entry is not None:
+        parts.append(f"вход {signal.entry:g}")
+    if signal.stop_loss is not None:
+        parts.append(f"SL {signal.stop_loss:g}")
+    if signal.take_profit is not None:
+        parts.append(f"TP {signal.take_profit:g}")
+    return ' · '.join(parts)
+
+# Пороги вероятности для фильтра сигналов (в процентах)
+SIGNAL_PROBABILITY_FILTERS = [0, 80, 90, 95]
+
+async def show_signal_suggestions(query, min_percent: int = 0, symbol: Optional[str] = None, page: int = 1):
+    """Показать предложения-сигналы, отсортированные по вероятности"""
+    purge_expired()
+    ids = signal_index.query(min_percent / 100, symbol)
+    
+    suggestions_per_page = 5
+    total_pages = max(1, math.ceil(len(ids) / suggestions_per_page))
+    page = max(1, min(page, total_pages))
+    start_idx = (page - 1) * suggestions_per_page
+    symbol_key = symbol or '*'
+    
+    text = (
+        f"📈 Сигналы (страница {page}/{total_pages})\n"
+        f"🔎 Вероятность ≥ {min_percent}%, символ: {symbol or 'все'}\n"
+        f"📨 Найдено: {len(ids)}\n\n"
+    )
+    
+    keyboard = []
+    for i, sugg_id in enumerate(ids[start_idx:start_idx + suggestions_per_page], start=start_idx + 1):
+        sugg = suggestions[sugg_id]
+        text += f"{i}. {signal_summary(sugg.signal)}\n"
+        text += f"   👤 {sugg.user_info} · 📌 {sugg.source[:30]}\n\n"
+        keyboard.append([
+            InlineKeyboardButton(f"✅ Одобрить {i}", callback_data=f"approve_{sugg_id}"),
+            InlineKeyboardButton(f"❌ Отклонить {i}", callback_data=f"reject_{sugg_id}")
+        ])
+    
+    # Фильтр по вероятности
+    keyboard.append([
+        InlineKeyboardButton(
+            f"{'• ' if percent == min_percent else ''}≥{percent}%",
+            callback_data=f"sig_{percent}_{symbol_key}_1"
+        )
+        for percent in SIGNAL_PROBABILITY_FILTERS
+    ])
+    
+    # Фильтр по символу (самые частые)
+    symbols = sorted(signal_index.symbols().items(), key=lambda x: (-x[1], x[0]))[:4]
+    symbol_row = [InlineKeyboardButton(
+        f"{'• ' if not symbol else ''}Все",
+        callback_data=f"sig_{min_percent}_*_1"
+    )]
+    for sym, _ in symbols:
+        symbol_row.append(InlineKeyboardButton(
+            f"{'• ' if sym == symbol else ''}{sym}",
+            callback_data=f"sig_{min_percent}_{sym}_1"
+        ))
+    keyboard.append(symbol_row)
+    
+    # Навигация
+    nav_row = []
+    if page > 1:
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f"sig_{min_percent}_{symbol_key}_{page-1}"))
+    nav_row.append(InlineKeyboardButton(f"{page}/{total_pages}", callback_data="ignore"))
+    if page < total_pages:
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f"sig_{min_percent}_{symbol_key}_{page+1}"))
+    keyboard.append(nav_row)
+    
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="view_suggestions_1")])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+def expand_slots(dates, times, now: Optional[datetime] = None) -> List[Tuple[datetime, str]]:
+    """Будущие слоты публикации (даты «дд.мм» × время «чч:мм») по московскому времени, по возрастанию"""
+    now = now or datetime.now(MOSCOW_TZ)
+    hours = sorted((int(time_str.split(':')[0]), time_str) for time_str in set(times))
+    
+    slots = []
+    for date_str in set(dates):
+        day, month = map(int, date_str.split('.'))
+        # Даты из прошедших месяцев относятся к следующему году
+        year = now.year + 1 if month < now.month else now.year
+        try:
+            start = MOSCOW_TZ.localize(datetime(year, month, day))
+        except ValueError:
+            # 29.02 в невисокосном году
+            continue
+        # Смещение пояса вычисляется раз на день; при переходе на летнее время — для каждого слота
+        fixed_offset = start.utcoffset() == MOSCOW_TZ.localize(datetime(year, month, day, 23)).utcoffset()
+        for hour, time_str in hours:
+            if fixed_offset:
+                scheduled_datetime = start.replace(hour=hour)
+            else:
+                scheduled_datetime = MOSCOW_TZ.localize(datetime(year, month, day, hour))
+            if scheduled_datetime >= now:
+                slots.append((scheduled_datetime, time_str))
+    
+    slots.sort()
+    return slots
+
+def schedule_suggestion(sugg: Suggestion, admin_id: int) -> int:
+    """Запланировать публикации по предложению (без сохранения данных)"""
+    scheduled_count = 0
+    expires_at = sugg.expires_at
+    keys = record_fingerprints(sugg)
+    
+    for scheduled_datetime, time_str in expand_slots(sugg.selected_dates, sugg.selected_times):
+        # Сигнал потеряет актуальность раньше этой и всех следующих публикаций
+        if expires_at and scheduled_datetime > expires_at:
+            break
+        
+        # Такой же пост на это время уже запланирован
+        if is_slot_taken(keys, scheduled_datetime):
+            continue
+        
+        post_id = str(uuid.uuid4())
+        
+        post_data = ScheduledPost(
+            id=post_id,
+            user_id=admin_id,
+            original_suggester=sugg.user_id,
+            messages=sugg.messages,
+            is_media_group=sugg.is_media_group,
+            time=time_str,
+            scheduled_at=scheduled_datetime,
+            chat_id=GROUP_ID,
+            source=sugg.source,
+            text_hash=sugg.text_hash,
+            expires_at=sugg.expires_at,
+            created_at=datetime.now()
+        )
+        
+        add_scheduled_post(post_data)
+        schedule_post_job(post_data)
+        
+        scheduled_count += 1
+    
+    return scheduled_count
+
 async def approve_suggestion(query, admin_id: int, suggestion_id: str):
     """Одобрить предложение и запланировать пост"""
     if suggestion_id not in suggestions:
@@ -681,63 +2623,20 @@ async def approve_suggestion(query, admin_id: int, suggestion_id: str):
         return
     
     sugg = suggestions[suggestion_id]
-    user_id = sugg.get('user_id')
+    user_id = sugg.user_id
     
-    # Создаем запланированные посты
-    moscow_tz = pytz.timezone('Europe/Moscow')
-    scheduled_count = 0
+    if is_expired(sugg):
+        purge_expired()
+        await query.edit_message_text("⌛ Сигнал устарел и удалён из очереди.")
+        defer_redraw(query, 2, show_suggestions, query, admin_id, 1)
+        return
     
-    for date_str in sugg['selected_dates']:
-        day, month = map(int, date_str.split('.'))
-        year = datetime.now().year
-        
-        if month < datetime.now().month:
-            year += 1
-        
-        for time_str in sugg['selected_times']:
-            hour = int(time_str.split(':')[0])
-            
-            scheduled_datetime = datetime(year, month, day, hour, 0, 0)
-            scheduled_datetime = moscow_tz.localize(scheduled_datetime)
-            
-            if scheduled_datetime < datetime.now(moscow_tz):
-                continue
-            
-            post_id = str(uuid.uuid4())
-            
-            post_data = {
-                'id': post_id,
-                'user_id': admin_id,
-                'original_suggester': user_id,
-                'forwarded_messages_info': sugg.get('forwarded_messages_info', []),
-                'is_media_group': sugg.get('is_media_group', False),
-                'date': scheduled_datetime.date().isoformat(),
-                'time': time_str,
-                'datetime': scheduled_datetime.isoformat(),
-                'chat_id': GROUP_ID,
-                'source': sugg.get('source', 'Неизвестно'),
-                'created_at': datetime.now().isoformat()
-            }
-            
-            scheduled_messages[post_id] = post_data
-            
-            trigger = DateTrigger(
-                run_date=scheduled_datetime
-            )
-            
-            scheduler.add_job(
-                post_scheduler.send_scheduled_message,
-                trigger=trigger,
-                args=[GROUP_ID, post_data],
-                id=f"post_{post_id}",
-                replace_existing=True
-            )
-            
-            scheduled_count += 1
+    # Создаем запланированные посты
+    scheduled_count = schedule_suggestion(sugg, admin_id)
     
     # Уведомляем пользователя
     try:
-        media_text = " (медиа-группа)" if sugg.get('is_media_group') else ""
+        media_text = " (медиа-группа)" if sugg.is_media_group else ""
         await query.get_bot().send_message(
             chat_id=user_id,
             text=f"✅ Ваше предложение поста{media_text} одобрено администратором!\n"
@@ -747,7 +2646,7 @@ async def approve_suggestion(query, admin_id: int, suggestion_id: str):
         pass
     
     # Удаляем предложение
-    del suggestions[suggestion_id]
+    remove_suggestion(suggestion_id)
     save_data()
     
     await query.edit_message_text(
@@ -756,8 +2655,7 @@ async def approve_suggestion(query, admin_id: int, suggestion_id: str):
     )
     
     # Возвращаемся к списку предложений
-    await asyncio.sleep(2)
-    await show_suggestions(query, admin_id, 1)
+    defer_redraw(query, 2, show_suggestions, query, admin_id, 1)
 
 async def reject_suggestion(query, admin_id: int, suggestion_id: str):
     """Отклонить предложение"""
@@ -766,7 +2664,7 @@ async def reject_suggestion(query, admin_id: int, suggestion_id: str):
         return
     
     sugg = suggestions[suggestion_id]
-    user_id = sugg.get('user_id')
+    user_id = sugg.user_id
     
     # Уведомляем пользователя
     try:
@@ -778,91 +2676,455 @@ async def reject_suggestion(query, admin_id: int, suggestion_id: str):
         pass
     
     # Удаляем предложение
-    del suggestions[suggestion_id]
+    remove_suggestion(suggestion_id)
     save_data()
     
     await query.edit_message_text("✅ Предложение отклонено")
     
     # Возвращаемся к списку предложений
-    await asyncio.sleep(2)
-    await show_suggestions(query, admin_id, 1)
+    defer_redraw(query, 2, show_suggestions, query, admin_id, 1)
+
+# Фильтры режима пакетной модерации
+REVIEW_FILTERS = {
+    'source': "📌 Источник",
+    'user': "👤 Пользователь",
+    'date': "📅 Дата",
+}
 
-async def show_user_posts(query, user_id: int, page: int = 1):
-    """Показать запланированные посты (только для админов)"""
-    if not await is_admin(user_id):
+def suggestion_filter_value(sugg: Suggestion, kind: str) -> str:
+    """Значение поля предложения для фильтра"""
+    if kind == 'source':
+        return sugg.source
+    if kind == 'user':
+        return sugg.user_info
+    return sugg.created_at.strftime('%d.%m.%Y')
+
+def get_review_session(admin_id: int) -> Dict:
+    """Состояние режима пакетной модерации администратора"""
+    if admin_id not in review_sessions:
+        review_sessions[admin_id] = {
+            'selected': set(),
+            'filter': None,
+            'filter_options': [],
+            'page': 1
+        }
+    return review_sessions[admin_id]
+
+def filtered_suggestions(review: Dict) -> List[tuple]:
+    """Предложения, подходящие под текущий фильтр (новые сверху)"""
+    items = suggestions.items()
+    if review['filter']:
+        kind, value = review['filter']
+        items = [(sid, sugg) for sid, sugg in items if suggestion_filter_value(sugg, kind) == value]
+    return sorted(items, key=lambda x: x[1].created_at, reverse=True)
+
+async def show_review_queue(query, admin_id: int, page: int = 1):
+    """Показать очередь предложений с множественным выбором"""
+    purge_expired()
+    review = get_review_session(admin_id)
+    # Убираем из выбора уже обработанные предложения
+    review['selected'] &= suggestions.keys()
+    
+    items = filtered_suggestions(review)
+    total_pages = max(1, math.ceil(len(items) / REVIEW_PAGE_SIZE))
+    page = max(1, min(page, total_pages))
+    review['page'] = page
+    
+    start_idx = (page - 1) * REVIEW_PAGE_SIZE
+    page_items = items[start_idx:start_idx + REVIEW_PAGE_SIZE]
+    
+    filter_text = "нет"
+    if review['filter']:
+        kind, value = review['filter']
+        filter_text = f"{REVIEW_FILTERS[kind]}: {value[:30]}"
+    
+    text = (
+        f"🗂 Пакетная модерация (страница {page}/{total_pages})\n\n"
+        f"🔎 Фильтр: {filter_text}\n"
+        f"📨 Предложений: {len(items)}\n"
+        f"☑️ Выбрано: {len(review['selected'])}"
+    )
+    
+    keyboard = []
+    for i, (sugg_id, sugg) in enumerate(page_items, start=start_idx + 1):
+        mark = "☑️" if sugg_id in review['selected'] else "⬜"
+        label = f"{mark} {i}. {sugg.user_info} — {sugg.source[:20]}"
+        keyboard.append([InlineKeyboardButton(label, callback_data=f"rv_toggle_{sugg_id}")])
+    
+    # Навигация
+    nav_row = []
+    if page > 1:
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f"rv_page_{page-1}"))
+    nav_row.append(InlineKeyboardButton(f"{page}/{total_pages}", callback_data="ignore"))
+    if page < total_pages:
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f"rv_page_{page+1}"))
+    keyboard.append(nav_row)
+    
+    keyboard.append([
+        InlineKeyboardButton("☑️ Страницу", callback_data="rv_select_page"),
+        InlineKeyboardButton("☑️ Все", callback_data="rv_select_all"),
+        InlineKeyboardButton("⬜ Снять", callback_data="rv_clear"),
+    ])
+    keyboard.append([
+        InlineKeyboardButton(label, callback_data=f"rv_filter_{kind}")
+        for kind, label in REVIEW_FILTERS.items()
+    ])
+    if review['filter']:
+        keyboard.append([InlineKeyboardButton("🔎 Сбросить фильтр", callback_data="rv_filter_reset")])
+    if review['selected']:
+        keyboard.append([
+            InlineKeyboardButton(f"✅ Одобрить ({len(review['selected'])})", callback_data="rv_approve"),
+            InlineKeyboardButton(f"❌ Отклонить ({len(review['selected'])})", callback_data="rv_reject"),
+        ])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="view_suggestions_1")])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(text, reply_markup=reply_markup)
+
+async def show_review_filter_options(query, admin_id: int, kind: str):
+    """Показать варианты значений для фильтра"""
+    review = get_review_session(admin_id)
+    
+    counts: Dict[str, int] = {}
+    for sugg in suggestions.values():
+        value = suggestion_filter_value(sugg, kind)
+        counts[value] = counts.get(value, 0) + 1
+    
+    # Значения могут быть длиннее лимита callback_data, поэтому передаём индекс
+    options = sorted(counts, key=lambda v: (-counts[v], v))[:20]
+    review['filter_options'] = [(kind, value) for value in options]
+    
+    keyboard = [
+        [InlineKeyboardButton(f"{value[:40] or '—'} ({counts[value]})", callback_data=f"rv_fset_{i}")]
+        for i, value in enumerate(options)
+    ]
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=f"rv_page_{review['page']}")])
+    
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await query.edit_message_text(f"🔎 Фильтр «{REVIEW_FILTERS[kind]}»:", reply_markup=reply_markup)
+
+async def approve_suggestions_batch(bot, admin_id: int, suggestion_ids: List[str]) -> tuple:
+    """Одобрить пачку предложений: одно сохранение, уведомления уходят в фоне"""
+    approved = 0
+    scheduled_total = 0
+    per_user: Dict[int, List[int]] = {}
+    
+    for suggestion_id in suggestion_ids:
+        sugg = remove_suggestion(suggestion_id)
+        if sugg is None or is_expired(sugg):
+            continue
+        scheduled_count = schedule_suggestion(sugg, admin_id)
+        per_user.setdefault(sugg.user_id, []).append(scheduled_count)
+        approved += 1
+        scheduled_total += scheduled_count
+    
+    if approved:
+        save_data()
+    
+    messages = []
+    for user_id, counts in per_user.items():
+        if len(counts) == 1:
+            text = (
+                f"✅ Ваше предложение поста одобрено администратором!\n"
+                f"📅 Запланировано публикаций: {counts[0]}"
+            )
+        else:
+            text = (
+                f"✅ Администратор одобрил ваши предложения: {len(counts)}\n"
+                f"📅 Запланировано публикаций: {sum(counts)}"
+            )
+        messages.append((user_id, text))
+    notification_dispatcher.send_background(bot, messages)
+    
+    return approved, scheduled_total
+
+async def reject_suggestions_batch(bot, suggestion_ids: List[str]) -> int:
+    """Отклонить пачку предложений: одно сохранение, уведомления уходят в фоне"""
+    per_user: Dict[int, int] = {}
+    for suggestion_id in suggestion_ids:
+        sugg = remove_suggestion(suggestion_id)
+        if sugg is None:
+            continue
+        user_id = sugg.user_id
+        per_user[user_id] = per_user.get(user_id, 0) + 1
+    
+    rejected = sum(per_user.values())
+    if rejected:
+        save_data()
+    
+    messages = []
+    for user_id, count in per_user.items():
+        if count == 1:
+            text = "❌ Ваше предложение поста было отклонено администратором."
+        else:
+            text = f"❌ Администратор отклонил ваши предложения: {count}"
+        messages.append((user_id, text))
+    notification_dispatcher.send_background(bot, messages)
+    
+    return rejected
+
+async def handle_review_action(query, admin_id: int):
+    """Обработка кнопок режима пакетной модерации"""
+    review = get_review_session(admin_id)
+    data = query.data
+    
+    if data.startswith("rv_page_"):
+        await show_review_queue(query, admin_id, int(data.replace("rv_page_", "")))
+    
+    elif data.startswith("rv_toggle_"):
+        sugg_id = data.replace("rv_toggle_", "")
+        if sugg_id in review['selected']:
+            review['selected'].discard(sugg_id)
+        elif sugg_id in suggestions:
+            review['selected'].add(sugg_id)
+        await show_review_queue(query, admin_id, review['page'])
+    
+    elif data == "rv_select_page":
+        items = filtered_suggestions(review)
+        start_idx = (review['page'] - 1) * REVIEW_PAGE_SIZE
+        review['selected'].update(sid for sid, _ in items[start_idx:start_idx + REVIEW_PAGE_SIZE])
+        await show_review_queue(query, admin_id, review['page'])
+    
+    elif data == "rv_select_all":
+        review['selected'].update(sid for sid, _ in filtered_suggestions(review))
+        await show_review_queue(query, admin_id, review['page'])
+    
+    elif data == "rv_clear":
+        review['selected'].clear()
+        await show_review_queue(query, admin_id, review['page'])
+    
+    elif data == "rv_filter_reset":
+        review['filter'] = None
+        await show_review_queue(query, admin_id, 1)
+    
+    elif data.startswith("rv_filter_"):
+        kind = data.replace("rv_filter_", "")
+        if kind in REVIEW_FILTERS:
+            await show_review_filter_options(query, admin_id, kind)
+    
+    elif data.startswith("rv_fset_"):
+        index = int(data.replace("rv_fset_", ""))
+        if index < len(review['filter_options']):
+            review['filter'] = review['filter_options'][index]
+        await show_review_queue(query, admin_id, 1)
+    
+    elif data in ("rv_approve", "rv_reject"):
+        selected = list(review['selected'])
+        review['selected'].clear()
+        if data == "rv_approve":
+            approved, scheduled_total = await approve_suggestions_batch(query.get_bot(), admin_id, selected)
+            text = (
+                f"✅ Одобрено предложений: {approved}\n"
+                f"📊 Запланировано публикаций: {scheduled_total}"
+            )
+        else:
+            rejected = await reject_suggestions_batch(query.get_bot(), selected)
+            text = f"✅ Отклонено предложений: {rejected}"
+        await query.edit_message_text(text)
+        defer_redraw(query, 2, show_review_queue, query, admin_id, 1)
+
+# Представления списка постов: код в callback_data → заголовок
+POST_VIEWS = {
+    'all': "📋 Все запланированные посты",
+    'my': "👤 Мои посты",
+    'src': "📌 Посты источника",
+    'sug': "🙋 Посты пользователя",
+}
+
+POST_GROUP_VIEWS = {
+    'src': ('source', "📌 Источники"),
+    'sug': ('original_suggester', "🙋 Предложившие пользователи"),
+}
+
+async def show_user_posts(query, user_id: int, page: int = 1, view: str = 'all', token: Optional[str] = None):
+    """Показать запланированные посты: все, свои, по источнику или по предложившему"""
+    admin = is_admin(user_id)
+    if not admin and view != 'my':
         await query.edit_message_text("❌ У вас нет прав для просмотра этой информации.")
         return
     
-    # Собираем все посты
-    all_posts = list(scheduled_messages.items())
-    
-    if not all_posts:
+    field, value, title = None, None, POST_VIEWS[view]
+    if view == 'my':
+        # Админ видит свои публикации, пользователь — одобренные предложения
+        field, value = ('user_id' if admin else 'original_suggester'), user_id
+    elif view == 'src':
+        field, value = 'source', resolve_source_token(token)
+        if value is not None:
+            title = f"📌 {value[:40]}"
+    elif view == 'sug':
+        field, value = 'original_suggester', int(token)
+        title = f"🙋 Предложил: {value}"
+    
+    back_data = "back_to_menu" if view in ('all', 'my') else f"pv_groups_{view}_1"
+    total = post_index.count(field, value)
+    
+    if not total:
         text = "Нет запланированных постов."
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_menu")]]
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data=back_data)]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await query.edit_message_text(text, reply_markup=reply_markup)
         return
     
     posts_per_page = 5
-    total_pages = math.ceil(len(all_posts) / posts_per_page)
+    total_pages = math.ceil(total / posts_per_page)
     page = max(1, min(page, total_pages))
     
     start_idx = (page - 1) * posts_per_page
-    end_idx = min(start_idx + posts_per_page, len(all_posts))
+    page_ids = post_index.page(field, value, start_idx, posts_per_page)
     
-    text = f"📋 Все запланированные посты (страница {page}/{total_pages}):\n\n"
+    text = f"{title} (страница {page}/{total_pages}):\n\n"
     
     keyboard = []
     
-    for i in range(start_idx, end_idx):
-        post_id, post = all_posts[i]
-        source = post.get('source', 'Неизвестно')
-        post_date = post.get('date')
-        if isinstance(post_date, str):
-            try:
-                post_date_obj = datetime.fromisoformat(post_date)
-                post_date = post_date_obj.strftime('%d.%m.%Y')
-            except:
-                post_date = str(post_date)
+    for i, post_id in enumerate(page_ids, start=start_idx):
+        post = scheduled_messages[post_id]
+        source = post.source
+        post_date = post.date.strftime('%d.%m.%Y') if post.date else '—'
         
-        suggester = post.get('original_suggester', 'Админ')
-        if suggester != 'Админ':
-            suggester = f"Предложил: {suggester}"
+        suggester = 'Админ'
+        if post.original_suggester:
+            suggester = f"Предложил: {post.original_suggester}"
         
-        media_info = "📸 Медиа-группа" if post.get('is_media_group') else "📝 Текст"
+        media_info = "📸 Медиа-группа" if post.is_media_group else "📝 Текст"
         
-        text += f"{i+1}. 📅 {post_date} ⏰ {post.get('time', '')}\n"
+        text += f"{i+1}. 📅 {post_date} ⏰ {post.time}\n"
         text += f"   📌 {media_info}\n"
         text += f"   📌 {source[:30]}\n"
         text += f"   👤 {suggester}\n"
         text += f"   🆔 {post_id[:6]}...\n\n"
         
-        keyboard.append([InlineKeyboardButton(
-            f"❌ Удалить пост {i+1}", 
-            callback_data=f"delete_{post_id}"
-        )])
+        if admin:
+            keyboard.append([InlineKeyboardButton(
+                f"❌ Удалить пост {i+1}", 
+                callback_data=f"delete_{post_id}"
+            )])
     
     # Навигация
+    page_prefix = f"pv_{view}_{token}_" if token is not None else f"pv_{view}_"
     nav_row = []
     if page > 1:
-        nav_row.append(InlineKeyboardButton("◀️", callback_data=f"prev_page_{page-1}"))
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f"{page_prefix}{page-1}"))
     nav_row.append(InlineKeyboardButton(f"{page}/{total_pages}", callback_data="ignore"))
     if page < total_pages:
-        nav_row.append(InlineKeyboardButton("▶️", callback_data=f"next_page_{page+1}"))
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f"{page_prefix}{page+1}"))
     
     if nav_row:
         keyboard.append(nav_row)
     
-    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_menu")])
+    if admin and view in ('src', 'sug'):
+        keyboard.append([
+            InlineKeyboardButton("⏪ −1 ч", callback_data=f"pb_shift_-1_{view}_{token}"),
+            InlineKeyboardButton(f"🗑 Удалить все ({total})", callback_data=f"pb_del_{view}_{token}"),
+            InlineKeyboardButton("⏩ +1 ч", callback_data=f"pb_shift_1_{view}_{token}"),
+        ])
+    
+    if view == 'all':
+        keyboard.append([
+            InlineKeyboardButton("👤 Мои", callback_data="pv_my_1"),
+            InlineKeyboardButton("📌 По источнику", callback_data="pv_groups_src_1"),
+            InlineKeyboardButton("🙋 По пользователю", callback_data="pv_groups_sug_1"),
+        ])
+    
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data=back_data)])
     
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(text, reply_markup=reply_markup)
 
+async def show_post_groups(query, view: str, page: int = 1):
+    """Список источников или предложивших пользователей с количеством постов"""
+    field, title = POST_GROUP_VIEWS[view]
+    groups = post_index.groups(field)
+    
+    if not groups:
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="pv_all_1")]]
+        await query.edit_message_text("Нет запланированных постов.", reply_markup=InlineKeyboardMarkup(keyboard))
+        return
+    
+    groups_per_page = REVIEW_PAGE_SIZE
+    total_pages = math.ceil(len(groups) / groups_per_page)
+    page = max(1, min(page, total_pages))
+    start_idx = (page - 1) * groups_per_page
+    
+    keyboard = []
+    for value, count in groups[start_idx:start_idx + groups_per_page]:
+        if view == 'src':
+            label, token = value[:40], source_token(value)
+        else:
+            label, token = str(value), str(value)
+        keyboard.append([InlineKeyboardButton(f"{label} ({count})", callback_data=f"pv_{view}_{token}_1")])
+    
+    nav_row = []
+    if page > 1:
+        nav_row.append(InlineKeyboardButton("◀️", callback_data=f"pv_groups_{view}_{page-1}"))
+    nav_row.append(InlineKeyboardButton(f"{page}/{total_pages}", callback_data="ignore"))
+    if page < total_pages:
+        nav_row.append(InlineKeyboardButton("▶️", callback_data=f"pv_groups_{view}_{page+1}"))
+    keyboard.append(nav_row)
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="pv_all_1")])
+    
+    await query.edit_message_text(f"{title}: {len(groups)}", reply_markup=InlineKeyboardMarkup(keyboard))
+
+def post_view_ids(view: str, token: str) -> List[str]:
+    """Все ID постов представления по источнику или предложившему"""
+    if view == 'src':
+        source = resolve_source_token(token)
+        return post_index.ids('source', source) if source is not None else []
+    return post_index.ids('original_suggester', int(token))
+
+async def handle_post_bulk_action(query, user_id: int):
+    """Пакетные операции над постами представления (callback_data с префиксом pb_)"""
+    if not is_admin(user_id):
+        return
+    
+    parts = query.data.split('_')
+    action = parts[1]
+    
+    if action == 'shift':
+        hours, view, token = int(parts[2]), parts[3], parts[4]
+        shifted, skipped = bulk_shift_posts(post_view_ids(view, token), timedelta(hours=hours))
+        text = f"✅ Сдвинуто постов: {shifted}"
+        if skipped:
+            text += f"\nℹ️ Пропущено (уже опубликованы, время прошло бы или занято): {skipped}"
+        await query.edit_message_text(text)
+        defer_redraw(query, 1, show_user_posts, query, user_id, 1, view, token)
+    
+    elif action == 'del':
+        view, token = parts[2], parts[3]
+        count = len(post_view_ids(view, token))
+        keyboard = [[
+            InlineKeyboardButton(f"🗑 Да, удалить {count}", callback_data=f"pb_delok_{view}_{token}"),
+            InlineKeyboardButton("🔙 Отмена", callback_data=f"pv_{view}_{token}_1"),
+        ]]
+        await query.edit_message_text(
+            f"⚠️ Удалить все запланированные посты ({count}) из этого списка?",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    elif action == 'delok':
+        view, token = parts[2], parts[3]
+        deleted = bulk_delete_posts(post_view_ids(view, token))
+        await query.edit_message_text(f"✅ Удалено постов: {deleted}")
+        defer_redraw(query, 1, show_main_menu, query)
+
+async def handle_post_view(query, user_id: int):
+    """Навигация по представлениям постов (callback_data с префиксом pv_)"""
+    parts = query.data.split('_')
+    view = parts[1]
+    
+    if view == 'groups':
+        if not is_admin(user_id):
+            return
+        await show_post_groups(query, parts[2], int(parts[3]))
+    elif view in ('src', 'sug'):
+        await show_user_posts(query, user_id, int(parts[3]), view, parts[2])
+    else:
+        await show_user_posts(query, user_id, int(parts[2]), view)
+
 async def show_help(query):
     """Показать справку"""
     user_id = query.from_user.id
     
-    if await is_admin(user_id):
+    if is_admin(user_id):
         text = (
             "❓ Справка для администраторов:\n\n"
             "📅 **Запланировать пост** - создать новую публикацию\n"
@@ -873,8 +3135,22 @@ async def show_help(query):
             "/start - Главное меню\n"
             "/cancel - Отмена текущего действия\n"
             "/add_admin <id> - добавить администратора\n"
-            "/remove_admin <id> - удалить администратора\n"
-            "/list_admins - список администраторов\n"
+            "/add_moderator <id> - добавить модератора (только рассмотрение предложений)\n"
+            "/remove_admin <id> - снять роль администратора или модератора\n"
+            "/list_admins - список сотрудников\n"
+            "/audit [id] - журнал изменений ролей\n"
+            "/delete_posts <условие> <значение> - удалить посты по дате, источнику или пользователю\n"
+            "/shift_posts <часы> <условие> <значение> - сдвинуть посты\n"
+            "/id - узнать свой ID"
+        )
+    elif can_review(user_id):
+        text = (
+            "❓ Справка для модераторов:\n\n"
+            "📨 **Предложения от пользователей** - просмотр, одобрение и отклонение предложений\n"
+            "📝 **Предложить пост** - отправить свой пост на рассмотрение\n\n"
+            "Команды:\n"
+            "/start - Главное меню\n"
+            "/cancel - Отмена текущего действия\n"
             "/id - узнать свой ID"
         )
     else:
@@ -897,21 +3173,7 @@ async def show_main_menu(query):
     """Показать главное меню"""
     user_id = query.from_user.id
     
-    if await is_admin(user_id):
-        keyboard = [
-            [InlineKeyboardButton("📅 Запланировать пост", callback_data="schedule_post")],
-            [InlineKeyboardButton("📋 Все запланированные посты", callback_data="my_posts_1")],
-            [InlineKeyboardButton("👥 Управление администраторами", callback_data="manage_admins")],
-            [InlineKeyboardButton("📨 Предложения от пользователей", callback_data="view_suggestions_1")],
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-        ]
-    else:
-        keyboard = [
-            [InlineKeyboardButton("📝 Предложить пост", callback_data="suggest_post")],
-            [InlineKeyboardButton("❓ Помощь", callback_data="help")]
-        ]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = InlineKeyboardMarkup(main_menu_keyboard(user_id))
     await query.edit_message_text(
         "👋 Главное меню. Выберите действие:",
         reply_markup=reply_markup
@@ -935,6 +3197,11 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
     # Проверяем, является ли сообщение частью медиа-группы
     media_group_id = update.message.media_group_id
     
+    # Ограничения проверяются до создания сессий; альбом считается одной попыткой
+    if not can_review(user_id) and media_group_id not in media_groups:
+        if not await check_submission_limits(update.message, user_id):
+            return None
+    
     if media_group_id:
         # Это сообщение из медиа-группы
         if media_group_id not in media_groups:
@@ -949,63 +3216,16 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
         media_groups[media_group_id]['messages'].append(update.message)
         media_groups[media_group_id]['last_update'] = datetime.now()
         
-        # Ждем немного, чтобы собрать все сообщения группы
-        await asyncio.sleep(2)
-        
-        # Проверяем, есть ли группа и не было ли новых сообщений
-        if media_group_id in media_groups:
-            # Собираем все сообщения группы
-            group_messages = media_groups[media_group_id]['messages']
-            
-            # Получаем информацию об отправителе из первого сообщения
-            first_msg = group_messages[0]
-            forward_from = first_msg.forward_from
-            forward_from_chat = first_msg.forward_from_chat
-            
-            if forward_from_chat:
-                source = forward_from_chat.title
-                source_type = "channel"
-            elif forward_from:
-                source = forward_from.full_name
-                source_type = "user"
-            else:
-                source = "Неизвестный источник"
-                source_type = "unknown"
-            
-            # Получаем информацию о пользователе
-            user = update.effective_user
-            user_info = f"@{user.username}" if user.username else f"{user.first_name} {user.last_name or ''}".strip()
-            
-            # Сохраняем информацию о сообщениях группы
-            forwarded_messages_info = []
-            for msg in group_messages:
-                forwarded_messages_info.append({
-                    'message_id': msg.message_id,
-                    'chat_id': msg.chat.id,
-                    'chat_title': msg.chat.title if hasattr(msg.chat, 'title') else None,
-                    'date': msg.date.isoformat() if msg.date else None
-                })
-            
-            user_sessions[user_id] = {
-                'forwarded_messages_info': forwarded_messages_info,
-                'is_media_group': True,
-                'message_text': f"Медиа-группа из {len(group_messages)} сообщений",
-                'source': source,
-                'source_type': source_type,
-                'selected_dates': [],
-                'current_month': datetime.now().month,
-                'current_year': datetime.now().year,
-                'user_info': user_info,
-                'user_id': user_id,
-                'is_suggestion': not await is_admin(user_id)
-            }
-            
-            # Очищаем временное хранилище
-            del media_groups[media_group_id]
-            
-            # Показываем выбор дат
-            await show_date_selection(update.message, user_id)
-            return SELECTING_DATES
+        # Сборка группы откладывается: каждое новое сообщение переносит срок
+        schedule_followup(
+            user_id,
+            MEDIA_GROUP_COLLECT_DELAY,
+            finalize_media_group,
+            media_group_id,
+            update.effective_user,
+            job_id=f"media_group_{media_group_id}"
+        )
+        return SELECTING_DATES
         
     else:
         # Одиночное сообщение
@@ -1029,12 +3249,15 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
         user_info = f"@{user.username}" if user.username else f"{user.first_name} {user.last_name or ''}".strip()
         
         # Сохраняем информацию о сообщении
-        forwarded_messages_info = [{
-            'message_id': update.message.message_id,
-            'chat_id': update.message.chat.id,
-            'chat_title': update.message.chat.title if hasattr(update.message.chat, 'title') else None,
-            'date': update.message.date.isoformat() if update.message.date else None
-        }]
+        forwarded_messages_info = (MessageRef(
+            message_id=update.message.message_id,
+            chat_id=update.message.chat.id,
+            chat_title=update.message.chat.title if hasattr(update.message.chat, 'title') else None,
+            date=update.message.date,
+            origin_chat_id=forward_from_chat.id if forward_from_chat else None,
+            origin_message_id=update.message.forward_from_message_id,
+            origin_date=forward_origin_date(update.message)
+        ),)
         
         user_sessions[user_id] = {
             'forwarded_messages_info': forwarded_messages_info,
@@ -1043,17 +3266,98 @@ async def handle_forwarded_message(update: Update, context: ContextTypes.DEFAULT
             'source': source,
             'source_type': source_type,
             'has_media': bool(update.message.photo or update.message.video or update.message.document or update.message.audio),
+            'text_hash': text_fingerprint(update.message.text or update.message.caption),
             'selected_dates': [],
             'current_month': datetime.now().month,
             'current_year': datetime.now().year,
             'user_info': user_info,
             'user_id': user_id,
-            'is_suggestion': not await is_admin(user_id)
+            'is_suggestion': not is_admin(user_id)
         }
         
         await show_date_selection(update.message, user_id)
         return SELECTING_DATES
 
+async def check_submission_limits(message, user_id: int) -> bool:
+    """Проверить квоту и частоту пересылок; при отказе предупредить один раз"""
+    if submission_limiter.quota_left(user_id) <= 0:
+        if submission_limiter.should_warn(user_id):
+            await message.reply_text(
+                f"⛔ Достигнут лимит: не более {SUGGESTION_DAILY_QUOTA} предложений за сутки.\n"
+                "Попробуйте позже."
+            )
+        return False
+    if not submission_limiter.take_token(user_id):
+        if submission_limiter.should_warn(user_id):
+            await message.reply_text(
+                f"⏳ Слишком много сообщений. Попробуйте через {submission_limiter.retry_after(user_id)} сек."
+            )
+        return False
+    return True
+
+async def finalize_media_group(media_group_id: str, user):
+    """Завершение сбора медиа-группы и переход к выбору дат"""
+    if media_group_id not in media_groups:
+        return
+    
+    user_id = user.id
+    
+    # Собираем все сообщения группы
+    group_messages = media_groups.pop(media_group_id)['messages']
+    
+    # Получаем информацию об отправителе из первого сообщения
+    first_msg = group_messages[0]
+    forward_from = first_msg.forward_from
+    forward_from_chat = first_msg.forward_from_chat
+    
+    if forward_from_chat:
+        source = forward_from_chat.title
+        source_type = "channel"
+    elif forward_from:
+        source = forward_from.full_name
+        source_type = "user"
+    else:
+        source = "Неизвестный источник"
+        source_type = "unknown"
+    
+    # Получаем информацию о пользователе
+    user_info = f"@{user.username}" if user.username else f"{user.first_name} {user.last_name or ''}".strip()
+    
+    # Сохраняем информацию о сообщениях группы
+    forwarded_messages_info = tuple(
+        MessageRef(
+            message_id=msg.message_id,
+            chat_id=msg.chat.id,
+            chat_title=msg.chat.title if hasattr(msg.chat, 'title') else None,
+            date=msg.date,
+            origin_chat_id=msg.forward_from_chat.id if msg.forward_from_chat else None,
+            origin_message_id=msg.forward_from_message_id,
+            origin_date=forward_origin_date(msg)
+        )
+        for msg in group_messages
+    )
+    
+    # Подпись альбома обычно есть только у одного сообщения
+    caption = next((msg.caption for msg in group_messages if msg.caption), None)
+    
+    user_sessions[user_id] = {
+        'forwarded_messages_info': forwarded_messages_info,
+        'is_media_group': True,
+        'message_text': f"Медиа-группа из {len(group_messages)} сообщений",
+        'text_hash': text_fingerprint(caption),
+        'source': source,
+        'source_type': source_type,
+        'selected_dates': [],
+        'current_month': datetime.now().month,
+        'current_year': datetime.now().year,
+        'user_info': user_info,
+        'user_id': user_id,
+        'is_suggestion': not is_admin(user_id)
+    }
+    
+    # Показываем выбор дат
+    await show_date_selection(first_msg, user_id)
+
 async def show_date_selection(message, user_id: int):
     """Показать выбор дат для публикации"""
     session = user_sessions[user_id]
@@ -1109,7 +3413,7 @@ async def show_date_selection(message, user_id: int):
         is_selected = date_str in selected_dates
         
         check_date = datetime(current_year, current_month, day).date()
-        is_past = check_date < datetime.now().date()
+        is_past = check_date < datetime.now(MOSCOW_TZ).date()
         
         if is_past:
             row.append(InlineKeyboardButton(f"{day}", callback_data="ignore"))
@@ -1201,152 +3505,135 @@ async def handle_date_selection(update: Update, context: ContextTypes.DEFAULT_TY
     
     if query.data == "finish_dates":
         if user_id in user_sessions and user_sessions[user_id].get('selected_dates'):
-            await show_count_selection(query, user_id)
-            return SELECTING_COUNT
+            await show_time_selection(query, user_id)
+            return SELECTING_TIMES
         else:
             await query.edit_message_text("❌ Выберите хотя бы одну дату!")
             return SELECTING_DATES
     
     return SELECTING_DATES
 
-async def show_count_selection(query, user_id: int):
-    """Показать выбор количества публикаций"""
-    keyboard = []
-    row = []
-    for i in range(1, 6):
-        row.append(InlineKeyboardButton(str(i), callback_data=f"count_{i}"))
-        if len(row) == 5:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_scheduling")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    if user_id in user_sessions:
-        selected_dates = user_sessions[user_id]['selected_dates']
-        dates_text = ', '.join(sorted(selected_dates))
-        
-        await query.edit_message_text(
-            f"📊 Выбрано дат: {len(selected_dates)} ({dates_text})\n\n"
-            f"Теперь выберите количество публикаций в день (максимум 5):",
-            reply_markup=reply_markup
-        )
-    else:
-        await query.edit_message_text("❌ Сессия не найдена. Начните заново с /start")
-        return ConversationHandler.END
-
-async def select_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик выбора количества публикаций"""
-    query = update.callback_query
-    await query.answer()
-    
-    if query.message.chat.type != 'private':
-        return ConversationHandler.END
-    
-    if query.data == "cancel_scheduling":
-        user_id = query.from_user.id
-        if user_id in user_sessions:
-            del user_sessions[user_id]
-        await query.edit_message_text("❌ Планирование отменено.")
-        return ConversationHandler.END
-    
-    count = int(query.data.split('_')[1])
-    user_id = query.from_user.id
-    
-    if user_id in user_sessions:
-        user_sessions[user_id]['post_count'] = count
-        user_sessions[user_id]['selected_times'] = []
-        
-        await show_time_selection(query, user_id, 1)
-        return SELECTING_TIMES
-    else:
-        await query.edit_message_text("❌ Сессия не найдена. Начните заново с /start")
-        return ConversationHandler.END
+def spread_times(count: int) -> List[str]:
+    """count времён, равномерно распределённых по доступному интервалу"""
+    if count <= 1:
+        return AVAILABLE_TIMES[:1]
+    last = len(AVAILABLE_TIMES) - 1
+    return [AVAILABLE_TIMES[round(i * last / (count - 1))] for i in range(count)]
 
-async def show_time_selection(query, user_id: int, current_selection: int):
-    """Показать выбор времени для публикации"""
-    if user_id not in user_sessions:
-        await query.edit_message_text("❌ Сессия не найдена. Начните заново с /start")
-        return
-    
-    total_needed = user_sessions[user_id]['post_count']
-    selected_times = user_sessions[user_id]['selected_times']
-    available_times = [t for t in AVAILABLE_TIMES if t not in selected_times]
-    
-    if current_selection > total_needed:
-        await save_or_suggest(query, user_id)
-        return
-    
+def time_selection_markup(selected_times: List[str]) -> InlineKeyboardMarkup:
+    """Сетка выбора времени: отметки выбранного, готовые наборы и завершение"""
     keyboard = []
     row = []
-    
-    for time_str in available_times:
-        row.append(InlineKeyboardButton(
-            time_str, 
-            callback_data=f"time_{time_str.replace(':', '_')}"
-        ))
-        if len(row) == 3:
+    for time_str in AVAILABLE_TIMES:
+        label = f"✅ {time_str}" if time_str in selected_times else time_str
+        row.append(InlineKeyboardButton(label, callback_data=f"time_{time_str.replace(':', '_')}"))
+        if len(row) == 4:
             keyboard.append(row)
             row = []
-    
     if row:
         keyboard.append(row)
     
-    if len(selected_times) > 0:
+    keyboard.append([
+        InlineKeyboardButton("🌅 Утро", callback_data="time_preset_morning"),
+        InlineKeyboardButton("🌆 Вечер", callback_data="time_preset_evening"),
+        InlineKeyboardButton("↔️ Равномерно", callback_data="time_preset_spread"),
+    ])
+    if selected_times:
         keyboard.append([InlineKeyboardButton(
-            "✅ Завершить выбор", 
+            f"✅ Готово ({len(selected_times)})",
             callback_data="finish_selection"
         )])
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_scheduling")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def show_time_selection(query, user_id: int):
+    """Показать сетку выбора времени (текст сообщения меняется только здесь)"""
+    if user_id not in user_sessions:
+        await query.edit_message_text("❌ Сессия не найдена. Начните заново с /start")
+        return
     
-    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="cancel_scheduling")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    selected_times_str = ', '.join(sorted(selected_times)) if selected_times else 'пока нет'
+    session = user_sessions[user_id]
+    selected_dates = session['selected_dates']
+    selected_times = session.setdefault('selected_times', [])
     
     await query.edit_message_text(
-        f"⏰ Выберите время для публикации {current_selection} из {total_needed}\n"
-        f"Уже выбрано: {selected_times_str}\n"
+        f"📊 Выбрано дат: {len(selected_dates)} ({', '.join(sorted(selected_dates))})\n\n"
+        f"⏰ Отметьте время публикаций (до {MAX_TIMES_PER_DAY} в день) или выберите готовый набор.\n"
         f"Доступное время: с 7:00 до 22:00",
-        reply_markup=reply_markup
+        reply_markup=time_selection_markup(selected_times)
     )
 
-async def select_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Обработчик выбора времени"""
+async def cancel_scheduling(query, user_id: int):
+    if user_id in user_sessions:
+        del user_sessions[user_id]
+    await query.edit_message_text("❌ Планирование отменено.")
+    return ConversationHandler.END
+
+async def select_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки количества из прежнего шага выбора (диалоги, начатые до обновления) ведут в сетку времени"""
     query = update.callback_query
     await query.answer()
     
     if query.message.chat.type != 'private':
         return ConversationHandler.END
     
+    user_id = query.from_user.id
     if query.data == "cancel_scheduling":
-        user_id = query.from_user.id
-        if user_id in user_sessions:
-            del user_sessions[user_id]
-        await query.edit_message_text("❌ Планирование отменено.")
+        return await cancel_scheduling(query, user_id)
+    
+    if user_id in user_sessions:
+        await show_time_selection(query, user_id)
+        return SELECTING_TIMES
+    else:
+        await query.edit_message_text("❌ Сессия не найдена. Начните заново с /start")
+        return ConversationHandler.END
+
+async def select_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отметка времени или готовый набор: меняется только клавиатура сообщения"""
+    query = update.callback_query
+    
+    if query.message.chat.type != 'private':
+        await query.answer()
         return ConversationHandler.END
     
     user_id = query.from_user.id
-    time_str = query.data.replace('time_', '').replace('_', ':')
+    if query.data == "cancel_scheduling":
+        await query.answer()
+        return await cancel_scheduling(query, user_id)
     
-    if user_id in user_sessions:
-        selected_times = user_sessions[user_id]['selected_times']
-        
-        if time_str not in selected_times:
+    if user_id not in user_sessions:
+        await query.answer()
+        await query.edit_message_text("❌ Сессия не найдена. Начните заново с /start")
+        return ConversationHandler.END
+    
+    session = user_sessions[user_id]
+    selected_times = session.setdefault('selected_times', [])
+    notice = None
+    
+    if query.data.startswith("time_preset_"):
+        preset = query.data.replace("time_preset_", "")
+        if preset == 'spread':
+            times = spread_times(len(selected_times) if len(selected_times) > 1 else 3)
+        else:
+            times = TIME_PRESETS[preset]
+        selected_times[:] = times
+    else:
+        time_str = query.data.replace('time_', '').replace('_', ':')
+        if time_str in selected_times:
+            selected_times.remove(time_str)
+        elif len(selected_times) >= MAX_TIMES_PER_DAY:
+            notice = f"Можно выбрать не больше {MAX_TIMES_PER_DAY} публикаций в день"
+        else:
             selected_times.append(time_str)
-            
-            current_selection = len(selected_times) + 1
-            total_needed = user_sessions[user_id]['post_count']
-            
-            if len(selected_times) < total_needed:
-                await show_time_selection(query, user_id, current_selection)
-                return SELECTING_TIMES
-            else:
-                await save_or_suggest(query, user_id)
-                return ConversationHandler.END
     
+    await query.answer(notice, show_alert=bool(notice))
+    if notice is None:
+        try:
+            await query.edit_message_reply_markup(reply_markup=time_selection_markup(selected_times))
+        except BadRequest as e:
+            # Набор совпал с уже выбранным — клавиатура не изменилась
+            if "not modified" not in str(e).lower():
+                raise
     return SELECTING_TIMES
 
 async def finish_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1357,14 +3644,16 @@ async def finish_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if query.message.chat.type != 'private':
         return ConversationHandler.END
     
+    user_id = query.from_user.id
     if query.data == "cancel_scheduling":
-        user_id = query.from_user.id
-        if user_id in user_sessions:
-            del user_sessions[user_id]
-        await query.edit_message_text("❌ Планирование отменено.")
-        return ConversationHandler.END
+        return await cancel_scheduling(query, user_id)
+    
+    if user_id in user_sessions:
+        session = user_sessions[user_id]
+        if not session.get('selected_times'):
+            return SELECTING_TIMES
+        session['post_count'] = len(session['selected_times'])
     
-    user_id = query.from_user.id
     await save_or_suggest(query, user_id)
     return ConversationHandler.END
 
@@ -1387,36 +3676,69 @@ async def create_suggestion(query, user_id: int):
     """Создать предложение от пользователя"""
     session = user_sessions[user_id]
     
-    suggestion_id = str(uuid.uuid4())
+    keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data="back_to_menu")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
     
-    suggestions[suggestion_id] = {
-        'id': suggestion_id,
-        'user_id': user_id,
-        'user_info': session.get('user_info', 'Неизвестно'),
-        'message_text': session.get('message_text', 'Медиа-группа'),
-        'forwarded_messages_info': session.get('forwarded_messages_info', []),
-        'is_media_group': session.get('is_media_group', False),
-        'selected_dates': session['selected_dates'],
-        'selected_times': session['selected_times'],
-        'post_count': session['post_count'],
-        'source': session.get('source', 'Неизвестно'),
-        'created_at': datetime.now().strftime('%d.%m.%Y %H:%M')
-    }
+    # Проверяем дубликаты по отпечаткам содержимого
+    keys = content_fingerprints(session['forwarded_messages_info'], session.get('text_hash'))
+    if find_pending_publication(keys):
+        await query.edit_message_text("ℹ️ Этот пост уже запланирован к публикации.", reply_markup=reply_markup)
+        del user_sessions[user_id]
+        return
+    
+    duplicates = suggestion_fingerprints.find(keys)
+    if duplicates:
+        existing = suggestions[next(iter(duplicates))]
+        if existing.user_id == user_id:
+            # Повторное предложение того же пользователя объединяем с существующим
+            existing.selected_dates = sorted(set(existing.selected_dates) | set(session['selected_dates']))
+            existing.selected_times = sorted(set(existing.selected_times) | set(session['selected_times']))
+            existing.post_count = len(existing.selected_times)
+            save_data()
+            await query.edit_message_text(
+                "ℹ️ Такое предложение уже ожидает рассмотрения.\n"
+                "Выбранные даты и время добавлены к нему.",
+                reply_markup=reply_markup
+            )
+        else:
+            await query.edit_message_text("ℹ️ Этот пост уже предложен и ожидает рассмотрения.", reply_markup=reply_markup)
+        del user_sessions[user_id]
+        return
+    
+    # Квота расходуется только на новые предложения, до записи на диск и уведомления администраторов
+    if not can_review(user_id) and not submission_limiter.count_submission(user_id):
+        await query.edit_message_text(
+            f"⛔ Достигнут лимит: не более {SUGGESTION_DAILY_QUOTA} предложений за сутки.\n"
+            "Попробуйте позже.",
+            reply_markup=reply_markup
+        )
+        del user_sessions[user_id]
+        return
+    
+    suggestion_id = str(uuid.uuid4())
+    signal = parse_signal(session.get('message_text'))
+    
+    add_suggestion(Suggestion(
+        id=suggestion_id,
+        user_id=user_id,
+        user_info=session.get('user_info', 'Неизвестно'),
+        message_text=session.get('message_text', 'Медиа-группа'),
+        text_hash=session.get('text_hash'),
+        signal=signal,
+        expires_at=signal_expiry(session['forwarded_messages_info']) if signal else None,
+        messages=session['forwarded_messages_info'],
+        is_media_group=session.get('is_media_group', False),
+        selected_dates=session['selected_dates'],
+        selected_times=session['selected_times'],
+        post_count=session['post_count'],
+        source=sys.intern(session.get('source') or 'Неизвестно'),
+        created_at=datetime.now()
+    ))
     
     save_data()
     
-    # Уведомляем всех админов
-    for admin_id in ADMINS:
-        try:
-            media_info = "📸 Медиа-группа" if session.get('is_media_group') else "📝 Сообщение"
-            await query.get_bot().send_message(
-                chat_id=admin_id,
-                text=f"📨 Новое предложение ({media_info}) от пользователя {session.get('user_info')}!\n"
-                     f"📅 Дат: {len(session['selected_dates'])}, ⏰ Время: {len(session['selected_times'])} вариантов\n"
-                     f"Используйте /start для просмотра предложений."
-            )
-        except:
-            pass
+    # Уведомление администраторов уходит в ближайшую сводку
+    notification_dispatcher.queue_suggestion(query.get_bot(), suggestion_id)
     
     dates_text = '\n'.join([f"• {d}" for d in sorted(session['selected_dates'])])
     times_text = '\n'.join([f"• {t}" for t in sorted(session['selected_times'])])
@@ -1431,9 +3753,6 @@ async def create_suggestion(query, user_id: int):
         f"⏳ Ожидайте решения администраторов. Вы получите уведомление, когда ваш пост одобрят или отклонят."
     )
     
-    keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data="back_to_menu")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await query.edit_message_text(response_text, reply_markup=reply_markup)
     
     # Очищаем сессию
@@ -1444,68 +3763,51 @@ async def save_and_schedule(query, user_id: int):
     session = user_sessions[user_id]
     selected_dates = session['selected_dates']
     selected_times = session['selected_times']
-    source = session.get('source', 'Неизвестно')
-    forwarded_messages_info = session.get('forwarded_messages_info', [])
+    source = sys.intern(session.get('source') or 'Неизвестно')
+    forwarded_messages_info = session.get('forwarded_messages_info', ())
     is_media_group = session.get('is_media_group', False)
+    keys = content_fingerprints(forwarded_messages_info, session.get('text_hash'))
     
     if not selected_dates or not selected_times:
         await query.edit_message_text("❌ Даты или время не выбраны. Попробуйте снова.")
         return
     
-    moscow_tz = pytz.timezone('Europe/Moscow')
     scheduled_count = 0
+    duplicate_count = 0
     
-    for date_str in selected_dates:
-        day, month = map(int, date_str.split('.'))
-        year = datetime.now().year
+    for scheduled_datetime, time_str in expand_slots(selected_dates, selected_times):
+        # Такой же пост на это время уже запланирован
+        if is_slot_taken(keys, scheduled_datetime):
+            duplicate_count += 1
+            continue
         
-        if month < datetime.now().month:
-            year += 1
+        post_id = str(uuid.uuid4())
         
-        for time_str in selected_times:
-            hour = int(time_str.split(':')[0])
-            
-            scheduled_datetime = datetime(year, month, day, hour, 0, 0)
-            scheduled_datetime = moscow_tz.localize(scheduled_datetime)
-            
-            if scheduled_datetime < datetime.now(moscow_tz):
-                continue
-            
-            post_id = str(uuid.uuid4())
-            
-            post_data = {
-                'id': post_id,
-                'user_id': user_id,
-                'forwarded_messages_info': forwarded_messages_info,
-                'is_media_group': is_media_group,
-                'date': scheduled_datetime.date().isoformat(),
-                'time': time_str,
-                'datetime': scheduled_datetime.isoformat(),
-                'chat_id': GROUP_ID,
-                'source': source,
-                'created_at': datetime.now().isoformat()
-            }
-            
-            scheduled_messages[post_id] = post_data
-            
-            trigger = DateTrigger(
-                run_date=scheduled_datetime
-            )
-            
-            scheduler.add_job(
-                post_scheduler.send_scheduled_message,
-                trigger=trigger,
-                args=[GROUP_ID, post_data],
-                id=f"post_{post_id}",
-                replace_existing=True
-            )
-            
-            scheduled_count += 1
+        post_data = ScheduledPost(
+            id=post_id,
+            user_id=user_id,
+            messages=forwarded_messages_info,
+            is_media_group=is_media_group,
+            time=time_str,
+            scheduled_at=scheduled_datetime,
+            chat_id=GROUP_ID,
+            source=source,
+            text_hash=session.get('text_hash'),
+            created_at=datetime.now()
+        )
+        
+        add_scheduled_post(post_data)
+        schedule_post_job(post_data)
+        
+        scheduled_count += 1
     
     save_data()
     
     if scheduled_count == 0:
-        await query.edit_message_text("❌ Все выбранные даты уже прошли. Выберите будущие даты.")
+        if duplicate_count:
+            await query.edit_message_text("ℹ️ Этот пост уже запланирован на выбранные даты и время.")
+        else:
+            await query.edit_message_text("❌ Все выбранные даты уже прошли. Выберите будущие даты.")
         return
     
     dates_text = '\n'.join([f"• {d}" for d in sorted(selected_dates)])
@@ -1521,6 +3823,8 @@ async def save_and_schedule(query, user_id: int):
         f"📊 Всего публикаций: {scheduled_count}\n\n"
         f"🔁 Все публикации будут сделаны как репосты с сохранением авторства."
     )
+    if duplicate_count:
+        response_text += f"\n\nℹ️ Пропущено дубликатов: {duplicate_count}"
     
     keyboard = [[InlineKeyboardButton("🔙 В главное меню", callback_data="back_to_menu")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1570,48 +3874,116 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
 
 # Команды для управления администраторами
-async def add_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Добавить администратора (только в личных сообщениях)"""
+async def grant_role_command(update: Update, context: ContextTypes.DEFAULT_TYPE, role: str, command: str):
+    """Назначить роль (только в личных сообщениях)"""
     if update.message.chat.type != 'private':
         return
     
     user_id = update.effective_user.id
-    if not await is_admin(user_id):
+    if not can_manage(user_id):
         await update.message.reply_text("❌ У вас нет прав для этой команды.")
         return
     
     if not context.args:
         await update.message.reply_text(
-            "❌ Использование: /add_admin <id_пользователя>\n"
+            f"❌ Использование: /{command} <id_пользователя>\n"
             "Чтобы узнать ID пользователя, попросите его отправить /id боту"
         )
         return
     
     try:
-        new_admin_id = int(context.args[0])
-        ADMINS.add(new_admin_id)
-        save_data()
-        await update.message.reply_text(f"✅ Пользователь {new_admin_id} добавлен в администраторы")
-        
-        # Уведомляем нового администратора
-        try:
-            await context.bot.send_message(
-                chat_id=new_admin_id,
-                text="🎉 Вас назначили администратором бота для планирования публикаций!\n"
-                     "Отправьте /start чтобы начать работу."
-            )
-        except:
-            pass
+        new_staff_id = int(context.args[0])
     except ValueError:
         await update.message.reply_text("❌ Неверный формат ID")
+        return
+    
+    if not access.grant(user_id, new_staff_id, role):
+        current = access.role(new_staff_id)
+        await update.message.reply_text(f"ℹ️ Роль пользователя {new_staff_id} не изменена: {ROLE_TITLES[current]}")
+        return
+    await update.message.reply_text(f"✅ Пользователю {new_staff_id} назначена роль: {ROLE_TITLES[role]}")
+    
+    # Уведомляем нового сотрудника
+    try:
+        await context.bot.send_message(
+            chat_id=new_staff_id,
+            text=f"🎉 Вам назначена роль в боте для планирования публикаций: {ROLE_TITLES[role]}!\n"
+                 "Отправьте /start чтобы начать работу."
+        )
+    except:
+        pass
+
+async def add_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Добавить администратора"""
+    await grant_role_command(update, context, ROLE_ADMIN, "add_admin")
+
+async def add_moderator_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Добавить модератора (только рассмотрение предложений)"""
+    await grant_role_command(update, context, ROLE_MODERATOR, "add_moderator")
+
+BULK_USAGE = (
+    "Условия: date <дд.мм[.гггг]> | source <источник> | suggester <id>\n"
+    "Например: /delete_posts date 20.10\n"
+    "/shift_posts 2 source https://t.me/channel"
+)
+
+async def delete_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Удалить все посты по условию: /delete_posts <условие> <значение>"""
+    if update.message.chat.type != 'private':
+        return
+    
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У вас нет прав для этой команды.")
+        return
+    
+    if len(context.args) < 2:
+        await update.message.reply_text(f"❌ Использование: /delete_posts <условие> <значение>\n{BULK_USAGE}")
+        return
+    
+    try:
+        post_ids = select_posts(context.args[0], ' '.join(context.args[1:]))
+    except ValueError:
+        await update.message.reply_text(f"❌ Неверное условие.\n{BULK_USAGE}")
+        return
+    
+    deleted = bulk_delete_posts(post_ids)
+    await update.message.reply_text(f"✅ Удалено постов: {deleted}")
+
+async def shift_posts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сдвинуть все посты по условию: /shift_posts <часы> <условие> <значение>"""
+    if update.message.chat.type != 'private':
+        return
+    
+    user_id = update.effective_user.id
+    if not is_admin(user_id):
+        await update.message.reply_text("❌ У вас нет прав для этой команды.")
+        return
+    
+    if len(context.args) < 3:
+        await update.message.reply_text(f"❌ Использование: /shift_posts <часы> <условие> <значение>\n{BULK_USAGE}")
+        return
+    
+    try:
+        hours = float(context.args[0].replace(',', '.'))
+        post_ids = select_posts(context.args[1], ' '.join(context.args[2:]))
+    except ValueError:
+        await update.message.reply_text(f"❌ Неверные часы или условие.\n{BULK_USAGE}")
+        return
+    
+    shifted, skipped = bulk_shift_posts(post_ids, timedelta(hours=hours))
+    text = f"✅ Сдвинуто постов: {shifted}"
+    if skipped:
+        text += f"\nℹ️ Пропущено (уже опубликованы, время прошло бы или занято): {skipped}"
+    await update.message.reply_text(text)
 
 async def remove_admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Удалить администратора (только в личных сообщениях)"""
+    """Снять роль администратора или модератора (только в личных сообщениях)"""
     if update.message.chat.type != 'private':
         return
     
     user_id = update.effective_user.id
-    if not await is_admin(user_id):
+    if not can_manage(user_id):
         await update.message.reply_text("❌ У вас нет прав для этой команды.")
         return
     
@@ -1626,35 +3998,56 @@ async def remove_admin_command(update: Update, context: ContextTypes.DEFAULT_TYP
         if remove_id == user_id:
             await update.message.reply_text("❌ Нельзя удалить самого себя!")
             return
-        if remove_id in ADMINS:
-            ADMINS.remove(remove_id)
-            save_data()
-            await update.message.reply_text(f"✅ Пользователь {remove_id} удален из администраторов")
+        if access.role(remove_id) == ROLE_OWNER:
+            await update.message.reply_text("❌ Владельца бота удалить нельзя")
+            return
+        role = access.revoke(user_id, remove_id)
+        if role:
+            await update.message.reply_text(f"✅ С пользователя {remove_id} снята роль: {ROLE_TITLES[role]}")
         else:
-            await update.message.reply_text("❌ Пользователь не является администратором")
+            await update.message.reply_text("❌ Пользователь не является администратором или модератором")
     except ValueError:
         await update.message.reply_text("❌ Неверный формат ID")
 
 async def list_admins_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показать список администраторов (только в личных сообщениях)"""
+    """Показать список сотрудников (только в личных сообщениях)"""
     if update.message.chat.type != 'private':
         return
     
     user_id = update.effective_user.id
-    if not await is_admin(user_id):
+    if not can_manage(user_id):
         await update.message.reply_text("❌ У вас нет прав для этой команды.")
         return
     
-    if ADMINS:
-        text = "👥 Список администраторов:\n\n"
-        for admin_id in ADMINS:
-            text += f"• {admin_id}\n"
-        text += f"\nВсего: {len(ADMINS)}"
+    staff = access.members()
+    if staff:
+        text = "👥 Список сотрудников:\n\n"
+        for staff_id in staff:
+            text += f"• {staff_id} — {ROLE_TITLES[access.role(staff_id)]}\n"
+        text += f"\nВсего: {len(staff)}"
     else:
         text = "❌ Нет администраторов"
     
     await update.message.reply_text(text)
 
+async def audit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Журнал изменений ролей: /audit [id_пользователя]"""
+    if update.message.chat.type != 'private':
+        return
+    
+    user_id = update.effective_user.id
+    if not can_manage(user_id):
+        await update.message.reply_text("❌ У вас нет прав для этой команды.")
+        return
+    
+    try:
+        target = int(context.args[0]) if context.args else None
+    except ValueError:
+        await update.message.reply_text("❌ Использование: /audit [id_пользователя]")
+        return
+    
+    await update.message.reply_text(audit_view(target))
+
 async def id_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать свой ID (для добавления в админы)"""
     if update.message.chat.type != 'private':
@@ -1666,82 +4059,406 @@ async def id_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Передайте этот ID администратору, чтобы он добавил вас."
     )
 
-async def restore_scheduled_jobs(app: Application):
-    """Восстановление запланированных заданий после перезапуска"""
-    logger.info("Восстановление запланированных заданий...")
+async def restore_scheduled_jobs(app: Application) -> int:
+    """Сверка хранилища заданий с запланированными постами после перезапуска.
+    Постоянное хранилище уже содержит задания, добавляются только недостающие."""
+    now = datetime.now(MOSCOW_TZ)
     
-    moscow_tz = pytz.timezone('Europe/Moscow')
-    now = datetime.now(moscow_tz)
+    stored = stored_job_ids(posts_jobstore)
+    known = {post_job_id(post_id) for post_id in scheduled_messages}
+    
+    # Задания удалённых постов
+    for job_id in stored - known:
+        try:
+            scheduler.remove_job(job_id, jobstore=POSTS_JOBSTORE)
+        except JobLookupError:
+            pass
     
     restored_count = 0
-    for post_id, post_data in scheduled_messages.items():
+    for post_id, post in scheduled_messages.items():
+        scheduled_datetime = post.scheduled_at
+        # Прошедшие публикации не восстанавливаем
+        if post_job_id(post_id) in stored or not scheduled_datetime or scheduled_datetime <= now:
+            continue
         try:
-            # Получаем datetime из сохраненных данных
-            if 'datetime' in post_data:
-                if isinstance(post_data['datetime'], str):
-                    scheduled_datetime = datetime.fromisoformat(post_data['datetime'])
-                else:
-                    scheduled_datetime = post_data['datetime']
-                
-                # Проверяем, что время еще не прошло
-                if scheduled_datetime > now:
-                    # Добавляем bot в post_data
-                    post_data['bot'] = app.bot
-                    
-                    trigger = DateTrigger(
-                        run_date=scheduled_datetime
-                    )
-                    
-                    scheduler.add_job(
-                        post_scheduler.send_scheduled_message,
-                        trigger=trigger,
-                        args=[GROUP_ID, post_data],
-                        id=f"post_{post_id}",
-                        replace_existing=True
-                    )
-                    restored_count += 1
-                    logger.info(f"Восстановлен пост {post_id} на {scheduled_datetime}")
+            schedule_post_job(post)
+            restored_count += 1
+            logger.debug(f"Восстановлен пост {post_id} на {scheduled_datetime}")
         except Exception as e:
             logger.error(f"Ошибка восстановления поста {post_id}: {e}")
     
-    logger.info(f"Восстановлено {restored_count} запланированных постов")
+    logger.info(f"Восстановлено {restored_count} запланированных постов, в хранилище заданий: {len(stored & known)}")
+    return restored_count
+
+async def verify_source_chats(app: Application) -> int:
+    """Проверка доступа к исходным чатам предстоящих постов (один запрос на чат)"""
+    now = datetime.now(MOSCOW_TZ)
+    chat_ids = {
+        post.messages[0].chat_id
+        for post in scheduled_messages.values()
+        if post.messages and post.scheduled_at and post.scheduled_at > now
+    }
+    limiter = RateLimiter(NOTIFY_RATE_LIMIT)
+    
+    async def check(chat_id: int) -> bool:
+        await limiter.wait()
+        try:
+            # Результат остаётся в общем кэше для публикаций и проверки источников
+            return await chat_cache.get(app.bot, chat_id) is not None
+        except Exception as e:
+            logger.warning(f"Не удалось получить доступ к чату {chat_id}: {e}")
+            return False
+    
+    results = await asyncio.gather(*(check(chat_id) for chat_id in chat_ids))
+    unavailable = results.count(False)
+    if unavailable:
+        logger.warning(f"Недоступно чатов: {unavailable}. Посты из них могут не отправиться, если бот не имеет доступа к исходным сообщениям")
+    return len(chat_ids) - unavailable
+
+class StartupProfile:
+    """Замер длительности этапов запуска"""
+    def __init__(self):
+        self.phases: List[Tuple[str, float]] = []
+    
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            with tracer.span(f"startup.{name}"):
+                yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+    
+    def report(self) -> str:
+        total = sum(elapsed for _, elapsed in self.phases)
+        parts = ', '.join(f"{name} {elapsed * 1000:.1f} мс" for name, elapsed in self.phases)
+        return f"Запуск за {total * 1000:.1f} мс: {parts}"
+
+async def post_init(app: Application):
+    """Запуск в цикле событий приложения: загрузка → индексы → восстановление → проверка"""
+    profile = StartupProfile()
+    registry.bind(app)
+    
+    with profile.phase("загрузка"):
+        load_data()
+    with profile.phase("роли"):
+        access.load(ADMINS)
+    with profile.phase("индексы"):
+        rebuild_indexes()
+    
+    scheduler.start()
+    logger.info("Планировщик запущен")
+    
+    # Периодическая очистка устаревших сигналов
+    scheduler.add_job(
+        purge_expired_job,
+        trigger='interval',
+        seconds=EXPIRY_CHECK_INTERVAL,
+        id="purge_expired",
+        replace_existing=True
+    )
+    # Заблаговременная проверка исходных сообщений
+    scheduler.add_job(
+        probe_sources_job,
+        trigger='interval',
+        seconds=SOURCE_PROBE_INTERVAL,
+        id="probe_sources",
+        replace_existing=True
+    )
+    # Пакетная запись незавершённых диалогов
+    scheduler.add_job(
+        save_sessions_job,
+        trigger='interval',
+        seconds=SESSION_SAVE_INTERVAL,
+        id="save_sessions",
+        replace_existing=True
+    )
+    # Статистика HTTP-соединений
+    scheduler.add_job(
+        log_http_metrics,
+        trigger='interval',
+        seconds=HTTP_METRICS_INTERVAL,
+        id="http_metrics",
+        replace_existing=True
+    )
+    # Периодическая запись трассы (чтобы она пережила аварийное завершение)
+    if tracer.enabled:
+        scheduler.add_job(
+            export_trace_job,
+            trigger='interval',
+            seconds=TRACE_EXPORT_INTERVAL,
+            id="trace_export",
+            replace_existing=True
+        )
+    # Очистка медиа-групп
+    scheduler.add_job(
+        cleanup_media_groups,
+        trigger='interval',
+        seconds=600,
+        id="cleanup_media_groups",
+        replace_existing=True
+    )
+    
+    with profile.phase("восстановление"):
+        await restore_scheduled_jobs(app)
+    with profile.phase("проверка чатов"):
+        await verify_source_chats(app)
+    
+    logger.info(profile.report())
+
+async def post_stop(app: Application):
+    """Плавная остановка, пока бот ещё может отправлять сообщения"""
+    await shutdown_coordinator.shutdown()
+
+async def post_shutdown(app: Application):
+    """Остановка планировщика вместе с приложением"""
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    await log_http_metrics()
+    tracer.export()
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """HTTP-клиент бота с интервалом трассировки вокруг каждого вызова Bot API"""
+    async def do_request(self, url: str, *args, **kwargs):
+        with tracer.span(f"api.{url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, *args, **kwargs)
+
+def serialize_session(session: Dict) -> Dict:
+    data = dict(session)
+    if 'forwarded_messages_info' in data:
+        data['forwarded_messages_info'] = [msg.to_dict() for msg in data['forwarded_messages_info']]
+    return data
+
+def deserialize_session(data: Dict) -> Dict:
+    session = dict(data)
+    if 'forwarded_messages_info' in session:
+        session['forwarded_messages_info'] = load_messages(session['forwarded_messages_info'])
+    return session
+
+class SessionPersistence(BasePersistence):
+    """Хранение незавершённых диалогов: состояния ConversationHandler и user_sessions.
+    Изменения копятся в памяти и записываются пакетно заданием планировщика."""
+    def __init__(self, path: str):
+        super().__init__(store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=False, callback_data=False),
+                         update_interval=SESSION_SAVE_INTERVAL)
+        self.path = path
+        self.conversations: Optional[Dict[str, Dict[tuple, object]]] = None
+        self._last_payload: Optional[bytes] = None
+    
+    def _load(self):
+        """Однократное чтение файла; заодно восстанавливает user_sessions"""
+        if self.conversations is not None:
+            return
+        self.conversations = {}
+        if not os.path.exists(self.path):
+            return
+        try:
+            data = read_snapshot(self.path)
+        except Exception as e:
+            logger.error(f"Не удалось прочитать незавершённые диалоги из {self.path}: {e}")
+            return
+        for name, items in data.get('conversations', {}).items():
+            self.conversations[name] = {tuple(key): state for key, state in items}
+        for user_id, session in data.get('user_sessions', {}).items():
+            try:
+                user_sessions[int(user_id)] = deserialize_session(session)
+            except Exception as e:
+                logger.error(f"Ошибка восстановления сессии {user_id}: {e}")
+        logger.info(f"Восстановлено незавершённых диалогов: {len(user_sessions)}")
+    
+    def serialize(self) -> Dict:
+        return {
+            'conversations': {
+                name: [[list(key), state] for key, state in states.items()]
+                for name, states in (self.conversations or {}).items()
+            },
+            'user_sessions': {str(user_id): serialize_session(session) for user_id, session in user_sessions.items()}
+        }
+    
+    def save(self):
+        """Записать диалоги, если они изменились с прошлой записи"""
+        if self.conversations is None:
+            return
+        payload = encode_payload(self.serialize())
+        if payload == self._last_payload:
+            return
+        with tracer.span("persist.sessions"):
+            write_snapshot_payload(self.path, payload)
+        self._last_payload = payload
+    
+    async def get_conversations(self, name: str) -> Dict:
+        self._load()
+        return dict(self.conversations.get(name, {}))
+    
+    async def update_conversation(self, name: str, key: tuple, new_state: Optional[object]):
+        self._load()
+        states = self.conversations.setdefault(name, {})
+        if new_state is None:
+            states.pop(key, None)
+        else:
+            states[key] = new_state
+    
+    async def flush(self):
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"Ошибка сохранения незавершённых диалогов: {e}")
+    
+    # Данные пользователей, чатов и бота хранятся в основном снимке, а не здесь
+    async def get_user_data(self) -> Dict:
+        return {}
+    
+    async def get_chat_data(self) -> Dict:
+        return {}
+    
+    async def get_bot_data(self) -> Dict:
+        return {}
+    
+    async def get_callback_data(self):
+        return None
+    
+    async def update_user_data(self, user_id: int, data: Dict):
+        pass
+    
+    async def update_chat_data(self, chat_id: int, data: Dict):
+        pass
+    
+    async def update_bot_data(self, data: Dict):
+        pass
+    
+    async def update_callback_data(self, data):
+        pass
+    
+    async def drop_user_data(self, user_id: int):
+        pass
+    
+    async def drop_chat_data(self, chat_id: int):
+        pass
+    
+    async def refresh_user_data(self, user_id: int, user_data: Dict):
+        pass
+    
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict):
+        pass
+    
+    async def refresh_bot_data(self, bot_data: Dict):
+        pass
+
+session_persistence = SessionPersistence(SESSIONS_FILE)
+
+async def save_sessions_job():
+    """Пакетная запись незавершённых диалогов"""
+    await session_persistence.flush()
+
+class HttpMetrics:
+    """Статистика HTTP-клиента: запросы, новые соединения и доля повторного использования"""
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.connections = 0
+        self.errors = 0
+    
+    async def on_request(self, request):
+        # Трассировка httpcore сообщает об открытии каждого нового TCP-соединения
+        request.extensions['trace'] = self._trace
+    
+    async def on_response(self, response):
+        self.requests += 1
+        if response.status_code >= 500:
+            self.errors += 1
+    
+    async def _trace(self, event_name: str, info: Dict):
+        if event_name == 'connection.connect_tcp.complete':
+            self.connections += 1
+    
+    def summary(self) -> str:
+        reuse = 1 - self.connections / self.requests if self.requests else 0.0
+        return (f"HTTP {self.name}: запросов {self.requests}, новых соединений {self.connections}, "
+                f"повторное использование {reuse:.0%}, ошибок сервера {self.errors}")
+
+send_http_metrics = HttpMetrics("отправка")
+polling_http_metrics = HttpMetrics("получение обновлений")
+
+def build_request(pool_size: int, metrics: HttpMetrics) -> HTTPXRequest:
+    """HTTP-клиент бота с собственным пулом соединений и keep-alive"""
+    return TracedHTTPXRequest(
+        connection_pool_size=pool_size,
+        connect_timeout=HTTP_TIMEOUT,
+        read_timeout=HTTP_TIMEOUT,
+        write_timeout=HTTP_TIMEOUT,
+        pool_timeout=HTTP_TIMEOUT,
+        http_version='2' if HTTP2_ENABLED and h2 else '1.1',
+        httpx_kwargs={
+            'limits': httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            'event_hooks': {'request': [metrics.on_request], 'response': [metrics.on_response]},
+        }
+    )
+
+async def log_http_metrics():
+    """Периодическая запись статистики HTTP-соединений"""
+    for metrics in (send_http_metrics, polling_http_metrics):
+        logger.info(metrics.summary())
 
 async def cleanup_media_groups():
-    """Очистка старых медиа-групп"""
-    while True:
-        await asyncio.sleep(600)  # 10 минут
-        current_time = datetime.now()
-        to_delete = []
-        for group_id, group_data in media_groups.items():
-            if (current_time - group_data['last_update']).total_seconds() > 300:  # 5 минут
-                to_delete.append(group_id)
-        for group_id in to_delete:
-            del media_groups[group_id]
-            logger.info(f"Очищена старая медиа-группа {group_id}")
+    """Очистка старых медиа-групп (запускается планировщиком раз в 10 минут)"""
+    current_time = datetime.now()
+    to_delete = []
+    for group_id, group_data in media_groups.items():
+        if (current_time - group_data['last_update']).total_seconds() > 300:  # 5 минут
+            to_delete.append(group_id)
+    for group_id in to_delete:
+        del media_groups[group_id]
+        logger.info(f"Очищена старая медиа-группа {group_id}")
 
 def main():
     """Основная функция запуска бота"""
-    # Загружаем данные
-    load_data()
+    # Перенос данных: python 1.py --export-json <файл> | --import-json <файл>
+    if len(sys.argv) > 1 and sys.argv[1] in ('--export-json', '--import-json'):
+        path = sys.argv[2] if len(sys.argv) > 2 else DATA_FILE
+        if sys.argv[1] == '--export-json':
+            load_data()
+            export_json(path)
+        else:
+            import_json(path)
+        return
     
+    # Трассировка: python 1.py --trace <файл>
+    trace_file = TRACE_FILE
+    if '--trace' in sys.argv[1:-1]:
+        trace_file = sys.argv[sys.argv.index('--trace') + 1]
+    if trace_file:
+        tracer.enable(trace_file)
+    
+    # Данные загружаются в post_init, уже в цикле событий приложения
     application = (
         Application.builder()
         .token(BOT_TOKEN)
-        .connect_timeout(30.0)
-        .read_timeout(30.0)
-        .write_timeout(30.0)
-        .pool_timeout(30.0)
+        .request(build_request(HTTP_SEND_POOL_SIZE, send_http_metrics))
+        .get_updates_request(build_request(HTTP_POLLING_POOL_SIZE, polling_http_metrics))
+        .concurrent_updates(update_processor)
+        .persistence(session_persistence)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
         .build()
     )
     
-    scheduler.start()
-    logger.info("Планировщик запущен")
-    
     # Добавляем команды для управления администраторами
     application.add_handler(CommandHandler("add_admin", add_admin_command))
+    application.add_handler(CommandHandler("add_moderator", add_moderator_command))
     application.add_handler(CommandHandler("remove_admin", remove_admin_command))
     application.add_handler(CommandHandler("list_admins", list_admins_command))
+    application.add_handler(CommandHandler("audit", audit_command))
     application.add_handler(CommandHandler("id", id_command))
+    application.add_handler(CommandHandler("delete_posts", delete_posts_command))
+    application.add_handler(CommandHandler("shift_posts", shift_posts_command))
+    
+    # Изменение членства бота в чатах сбрасывает кэш доступа к ним
+    application.add_handler(ChatMemberHandler(handle_my_chat_member, ChatMemberHandler.MY_CHAT_MEMBER))
     
     # Обработчик для игнорируемых кнопок
     application.add_handler(CallbackQueryHandler(ignore_callback, pattern="^ignore$"))
@@ -1768,7 +4485,8 @@ def main():
             MessageHandler(filters.FORWARDED, handle_forwarded_message),
         ],
         per_message=False,
-        name="post_scheduler_conversation"
+        name="post_scheduler_conversation",
+        persistent=True
     )
     
     application.add_handler(CommandHandler("start", start))
@@ -1785,12 +4503,6 @@ def main():
     print("✅ Посты будут публиковаться как РЕПОСТЫ с сохранением авторства!")
     print("Для остановки нажмите Ctrl+C")
     
-    # Восстанавливаем запланированные задания
-    asyncio.get_event_loop().run_until_complete(restore_scheduled_jobs(application))
-    
-    # Запускаем очистку медиа-групп
-    asyncio.get_event_loop().create_task(cleanup_media_groups())
-    
     try:
         # Запускаем бота
         application.run_polling(
@@ -1805,9 +4517,8 @@ def main():
         logger.error(f"Критическая ошибка: {e}")
         print(f"Критическая ошибка: {e}")
     finally:
-        # Останавливаем планировщик при завершении
-        scheduler.shutdown()
-        save_data()
+        # Обычно данные уже записаны в post_stop; здесь — если остановка прошла мимо него
+        shutdown_coordinator.flush()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file